@@ -10,14 +10,19 @@ repository root.
 
 import os
 import io
+import math
 import re
+import codecs
 import sys
+import threading
+import asyncio
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urljoin
 
 from git import Repo
 import tweepy
-from atproto import Client, client_utils, models
+from atproto import Client, SessionEvent, client_utils, models
 import httpx
 from PIL import Image
 
@@ -46,18 +51,161 @@ try:
 except ImportError:
     BLUESKY_USERNAME = os.environ.get("INPUT_BLUESKY_USERNAME", None)
     BLUESKY_TOKEN = os.environ.get("INPUT_BLUESKY_TOKEN", None)
+# Optional file to keep the BlueSky session between runs
+BLUESKY_SESSION_FILE = os.environ.get("INPUT_BLUESKY_SESSION_FILE", None)
 
 
 SEND_TWEET = False
 SEND_SKEET = True
 
 BLUESKY_MAX_BLOB_SIZE = 1_000_000
+# Link card thumbnails are shown at most 1000px wide or tall by the BlueSky CDN
+BLUESKY_THUMB_MAX_SIZE = 1000
+JPEG_QUALITY = 85
+JPEG_MIN_QUALITY = 65
+# JPEG_MIN_QUALITY encodes are ~2/3 the size, so allow ~1.2x the dimensions
+JPEG_MIN_QUALITY_GAIN = 1.2
+# Aim below the limit, as the size estimate for the next encode is rough
+COMPRESS_SIZE_MARGIN = 0.9
+MAX_COMPRESS_ATTEMPTS = 6
 
 TWITTER_LINK_LENGTH = 24  # Includes an extra character for a '\n'
 TWITTER_MAX_CHARS = 280
 BLUESKY_MAX_CHARS = 300
 POST_MAX_CHARS = min(TWITTER_MAX_CHARS, BLUESKY_MAX_CHARS)
 
+# A slow or huge page should not stall or balloon the posting job
+HTTP_TIMEOUT = httpx.Timeout(10.0, connect=5.0)
+HTTP_LIMITS = httpx.Limits(max_connections=10, max_keepalive_connections=10)
+MAX_HTML_BYTES = 1_000_000
+MAX_IMAGE_BYTES = 15_000_000
+# Longest tag kept between chunks while parsing the <head> of a page
+MAX_HTML_TAG_CHARS = 8192
+# Images compressed in parallel, Pillow releases the GIL while encoding
+IMAGE_WORKERS = min(4, os.cpu_count() or 1)
+
+_http_client = None
+_http_client_lock = threading.Lock()
+_bluesky_client = None
+
+
+class ResponseTooLarge(Exception):
+    """A response body is larger than the maximum size allowed."""
+
+
+def get_http_client():
+    """Return the HTTP client shared by all the requests in this run.
+
+    It is created on first use, and keeps connections alive so that they are
+    reused by later requests to the same host, even across entries. It can be
+    called from several threads at once, only one client is ever created.
+    """
+    global _http_client
+    with _http_client_lock:
+        if _http_client is None:
+            _http_client = httpx.Client(
+                timeout=HTTP_TIMEOUT,
+                limits=HTTP_LIMITS,
+                follow_redirects=True,
+            )
+        return _http_client
+
+
+def close_http_client():
+    """Close the shared HTTP client, if it was created."""
+    global _http_client
+    with _http_client_lock:
+        if _http_client is not None:
+            _http_client.close()
+            _http_client = None
+
+
+def _iter_body(response, max_bytes, truncate=False):
+    """Yield the body of a streamed response in chunks, up to a maximum size.
+
+    :param response: The streamed response to read.
+    :param max_bytes: Maximum number of (decompressed) bytes to read.
+    :param truncate: Stop after max_bytes of a larger body instead of raising
+        ResponseTooLarge.
+    """
+    length = response.headers.get("content-length", "")
+    if not truncate and length.isdigit() and int(length) > max_bytes:
+        raise ResponseTooLarge(f"{response.url} is {length} bytes")
+    remaining = max_bytes
+    for chunk in response.iter_bytes():
+        if len(chunk) > remaining:
+            if not truncate:
+                raise ResponseTooLarge(
+                    f"{response.url} is over {max_bytes} bytes"
+                )
+            yield chunk[:remaining]
+            return
+        remaining -= len(chunk)
+        yield chunk
+
+
+def _download(url, max_bytes):
+    """Download a URL with the shared HTTP client, up to a maximum size.
+
+    :param url: URL to download.
+    :param max_bytes: Maximum number of (decompressed) bytes to read.
+    :return: A tuple containing the body bytes and the (closed) response.
+    """
+    with get_http_client().stream("GET", url) as response:
+        response.raise_for_status()
+        body = b"".join(_iter_body(response, max_bytes))
+    return body, response
+
+
+# Open Graph properties used for a link card, the page is read until found
+_CARD_PROPERTIES = ("og:image", "og:title", "og:description")
+_META_TAG_PATTERN = re.compile(r"<meta\b[^>]*>", re.IGNORECASE)
+_ATTR_PATTERN = re.compile(
+    r"([a-zA-Z_:][-a-zA-Z0-9_:.]*)\s*=\s*([\"'])(.*?)\2",
+    re.DOTALL,
+)
+_HEAD_END_PATTERN = re.compile(r"</head\s*>|<body\b", re.IGNORECASE)
+
+
+def _read_head_meta_tags(chunks, encoding):
+    """Collect the attributes of the <meta> tags in the <head> of a page.
+
+    The HTML is parsed as it arrives, and reading stops at the end of the
+    <head> or as soon as all the Open Graph card properties are found, so
+    usually only the first few KB of a page are downloaded.
+
+    :param chunks: Iterable of the HTML bytes, as they are received.
+    :param encoding: Character encoding of the HTML.
+    :return: A list of dictionaries, one per meta tag, with the attribute
+        names in lower case.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    meta_tags = []
+    found = set()
+    # Text not parsed yet, only ever an unfinished tag from the last chunk
+    pending = ""
+    for chunk in chunks:
+        html = pending + decoder.decode(chunk)
+        head_end = _HEAD_END_PATTERN.search(html)
+        end = head_end.start() if head_end else len(html)
+        for tag in _META_TAG_PATTERN.finditer(html, 0, end):
+            attrs = {
+                key.lower(): value.strip()
+                for key, _quote, value in _ATTR_PATTERN.findall(tag.group())
+            }
+            if attrs:
+                meta_tags.append(attrs)
+                if attrs.get("content"):
+                    found.add(attrs.get("property", "").lower())
+        if head_end or found.issuperset(_CARD_PROPERTIES):
+            break
+        unfinished = html.rfind("<", max(0, len(html) - MAX_HTML_TAG_CHARS))
+        if unfinished != -1 and html.find(">", unfinished) == -1:
+            pending = html[unfinished:]
+        else:
+            pending = ""
+    return meta_tags
+
 
 def get_commit_list_entries(commit):
     """Extract an Awesome list entry from a given git commit in this repo."""
@@ -235,22 +383,41 @@ def format_msg_bluesky(section, title, url, description):
 def _compress_image(img_data, max_size=BLUESKY_MAX_BLOB_SIZE):
     """Compress an image to fit within max_size bytes.
 
-    Converts to JPEG and progressively reduces dimensions until it fits.
+    Converts to JPEG no larger than the link card thumbnail BlueSky displays,
+    then uses the size of each encode to pick the scale and quality for the
+    next one, which usually fits on the first or second attempt.
     """
     img = Image.open(io.BytesIO(img_data))
+    # JPEGs can be decoded directly at a reduced size, much faster
+    img.draft("RGB", (BLUESKY_THUMB_MAX_SIZE, BLUESKY_THUMB_MAX_SIZE))
     img = img.convert("RGB")
+    img.thumbnail(
+        (BLUESKY_THUMB_MAX_SIZE, BLUESKY_THUMB_MAX_SIZE), Image.LANCZOS
+    )
 
-    # Try progressively smaller scale factors
-    for scale in (1.0, 0.75, 0.5, 0.35, 0.25, 0.15, 0.1):
-        w = int(img.width * scale)
-        h = int(img.height * scale)
-        resized = img.resize((w, h), Image.LANCZOS)
+    resized = img
+    quality = JPEG_QUALITY
+    for _ in range(MAX_COMPRESS_ATTEMPTS):
         buf = io.BytesIO()
-        resized.save(buf, format="JPEG", quality=85, optimize=True)
+        resized.save(buf, format="JPEG", quality=quality, optimize=True)
         if buf.tell() <= max_size:
-            print(f"Compressed image to {w}x{h} ({buf.tell()} bytes).")
+            print(
+                f"Compressed image to {resized.width}x{resized.height} "
+                f"at quality {quality} ({buf.tell()} bytes)."
+            )
             return buf.getvalue(), "image/jpeg"
 
+        # The JPEG size is roughly proportional to the number of pixels, and
+        # dropping the quality shrinks it too, so use that before the scale
+        # gets too small
+        scale = math.sqrt(max_size / buf.tell() * COMPRESS_SIZE_MARGIN)
+        if scale < 0.75 and quality > JPEG_MIN_QUALITY:
+            quality = JPEG_MIN_QUALITY
+            scale = min(1.0, scale * JPEG_MIN_QUALITY_GAIN)
+        w = max(1, int(resized.width * scale))
+        h = max(1, int(resized.height * scale))
+        resized = img.resize((w, h), Image.LANCZOS)
+
     raise Exception(f"Could not compress image to under {max_size} bytes.")
 
 
@@ -267,24 +434,6 @@ def _get_og_tags(url):
         - og_description: The og:description content,
           or None.
     """
-    # Posting Open Graph Protocol (OGP) social media cards, based on example:
-    # https://github.com/MarshalX/atproto/blob/v0.0.56/examples/advanced_usage/send_ogp_link_card.py
-    _META_TAG_PATTERN = re.compile(r"<meta\b[^>]*>", re.IGNORECASE)
-    _ATTR_PATTERN = re.compile(
-        r"([a-zA-Z_:][-a-zA-Z0-9_:.]*)\s*=\s*([\"'])(.*?)\2",
-        re.DOTALL,
-    )
-
-    def _extract_meta_tags(html):
-        meta_tags = []
-        for tag in _META_TAG_PATTERN.findall(html):
-            attrs = {
-                key.lower(): value.strip()
-                for key, _quote, value in _ATTR_PATTERN.findall(tag)
-            }
-            if attrs:
-                meta_tags.append(attrs)
-        return meta_tags
 
     def _get_tag_value(meta_tags, attr_name, attr_value):
         attr_name = attr_name.lower()
@@ -313,13 +462,18 @@ def _get_og_tags(url):
                 content_type = "image/jpeg"
         return content_type
 
+    # Posting Open Graph Protocol (OGP) social media cards, based on example:
+    # https://github.com/MarshalX/atproto/blob/v0.0.56/examples/advanced_usage/send_ogp_link_card.py
     try:
-        response = httpx.get(url)
-        response.raise_for_status()
+        with get_http_client().stream("GET", url) as response:
+            response.raise_for_status()
+            meta_tags = _read_head_meta_tags(
+                _iter_body(response, MAX_HTML_BYTES, truncate=True),
+                response.encoding,
+            )
     except (httpx.HTTPStatusError, httpx.RequestError) as e:
         print(f"Warning: Could not fetch URL: {e}")
         return None, None, None, None, None
-    meta_tags = _extract_meta_tags(response.text)
     og_image = _get_tag_value(meta_tags, "property", "og:image")
     og_title = _get_tag_value(meta_tags, "property", "og:title")
     og_description = _get_tag_value(meta_tags, "property", "og:description")
@@ -343,25 +497,128 @@ def _get_og_tags(url):
     img_content_type = None
     if og_image:
         try:
-            img_resp = httpx.get(og_image, follow_redirects=True)
-            img_resp.raise_for_status()
-            img_data = img_resp.content
+            img_data, img_resp = _download(og_image, MAX_IMAGE_BYTES)
             img_content_type = _detect_image_content_type(
                 img_data, img_resp.headers.get("content-type", "")
             )
         except (httpx.HTTPStatusError, httpx.RequestError):
             print(f"Warning: og:image URL not accessible: {og_image}")
+        except ResponseTooLarge as e:
+            print(f"Warning: og:image too large to use: {e}")
     return img_data, img_content_type, og_image, og_title, og_description
 
 
-def skeet_msg(text_builder, url, dry_run=False):
-    """Post to BlueSky the given message content."""
-    # Always fetch OG content and compress image, even in dry run
-    img_data, img_content_type, img_url, title, description = _get_og_tags(url)
+def _fit_blob_size(img_data, img_content_type):
+    """Compress an image if it is over the BlueSky blob size limit.
 
+    :return: A tuple containing the image data and its content type.
+    """
     if img_data and len(img_data) > BLUESKY_MAX_BLOB_SIZE:
         print(f"Image too large ({len(img_data)} bytes), compressing...")
-        img_data, img_content_type = _compress_image(img_data)
+        return _compress_image(img_data)
+    return img_data, img_content_type
+
+
+def prepare_link_card(url):
+    """Fetch the link card content of a URL, with its image ready to post.
+
+    :return: The same tuple as _get_og_tags(), with the image compressed to
+        fit in a BlueSky blob.
+    """
+    img_data, img_content_type, img_url, title, description = _get_og_tags(url)
+    img_data, img_content_type = _fit_blob_size(img_data, img_content_type)
+    return img_data, img_content_type, img_url, title, description
+
+
+async def _prepare_link_cards(urls):
+    """Prepare the link cards of several URLs concurrently.
+
+    The pages and images are fetched in as many threads as the HTTP client
+    has connections, so that no fetch waits for a free connection, and the
+    images are compressed in a pool of IMAGE_WORKERS threads, so the whole
+    takes about as long as the slowest card.
+
+    :return: A list with the prepare_link_card() tuple for each URL, in the
+        same order, or the exception raised while preparing it.
+    """
+    loop = asyncio.get_running_loop()
+    fetch_pool = ThreadPoolExecutor(HTTP_LIMITS.max_connections)
+    with fetch_pool, ThreadPoolExecutor(IMAGE_WORKERS) as image_pool:
+
+        async def prepare(url):
+            img_data, img_content_type, img_url, title, description = (
+                await loop.run_in_executor(fetch_pool, _get_og_tags, url)
+            )
+            img_data, img_content_type = await loop.run_in_executor(
+                image_pool, _fit_blob_size, img_data, img_content_type
+            )
+            return img_data, img_content_type, img_url, title, description
+
+        return await asyncio.gather(
+            *(prepare(url) for url in urls), return_exceptions=True
+        )
+
+
+def _load_bluesky_session(client):
+    """Resume the BlueSky session saved by a previous run, if possible.
+
+    The client refreshes an expired access token on the first request, but if
+    the refresh token is no longer valid either the session is discarded.
+
+    :return: True if the client is logged in with the saved session.
+    """
+    if not BLUESKY_SESSION_FILE or not os.path.isfile(BLUESKY_SESSION_FILE):
+        return False
+    with open(BLUESKY_SESSION_FILE, encoding="utf-8") as f:
+        session_string = f.read().strip()
+    try:
+        profile = client.login(session_string=session_string)
+    except Exception as e:
+        print(f"Saved BlueSky session not usable, logging in again: {e}")
+        return False
+    if BLUESKY_USERNAME.lstrip("@") not in (profile.handle, profile.did):
+        print("Saved BlueSky session is for another account, ignoring it.")
+        return False
+    return True
+
+
+def _save_bluesky_session(event, session):
+    """Write the BlueSky session to the session file when it changes."""
+    if event in (SessionEvent.CREATE, SessionEvent.REFRESH):
+        with open(BLUESKY_SESSION_FILE, "w", encoding="utf-8") as f:
+            f.write(session.export())
+
+
+def get_bluesky_client():
+    """Return the BlueSky client logged in once for all the posts in this run.
+
+    If BLUESKY_SESSION_FILE is set the session is restored from it instead of
+    logging in with the app token, and saved back when created or refreshed.
+    """
+    global _bluesky_client
+    if _bluesky_client is None:
+        if not all((BLUESKY_USERNAME, BLUESKY_TOKEN)):
+            print("BlueSky username or token not available.")
+            sys.exit(1)
+        client = Client()
+        if BLUESKY_SESSION_FILE:
+            client.on_session_change(_save_bluesky_session)
+        if not _load_bluesky_session(client):
+            client.login(BLUESKY_USERNAME, BLUESKY_TOKEN)
+        _bluesky_client = client
+    return _bluesky_client
+
+
+def skeet_msg(text_builder, url, dry_run=False, link_card=None):
+    """Post to BlueSky the given message content.
+
+    :param link_card: Link card content for the URL from prepare_link_card(),
+        fetched if not given.
+    """
+    # Always fetch OG content and compress image, even in dry run
+    if link_card is None:
+        link_card = prepare_link_card(url)
+    img_data, img_content_type, img_url, title, description = link_card
 
     if dry_run:
         print("Dry run: skipping BlueSky post.")
@@ -374,11 +631,7 @@ def skeet_msg(text_builder, url, dry_run=False):
             )
         return
 
-    if not all((BLUESKY_USERNAME, BLUESKY_TOKEN)):
-        print("BlueSky username or token not available.")
-        sys.exit(1)
-    client = Client()
-    client.login(BLUESKY_USERNAME, BLUESKY_TOKEN)
+    client = get_bluesky_client()
 
     if title and description:
         thumb_blob = None
@@ -445,7 +698,25 @@ def main():
     print(f"\n{'-' * 50}\n🚀 Post trigger detected!\n{'-' * 50}\n")
     entries = get_commit_list_entries(commit)
     readme = get_commit_readme(commit)
-    for i, entry in enumerate(entries):
+    try:
+        post_entries(entries, readme, dry_run)
+    finally:
+        close_http_client()
+
+
+def post_entries(entries, readme, dry_run=False):
+    """Format and post each of the Awesome List entries from a commit.
+
+    The link cards of all the entries are prepared concurrently first, then
+    the entries are posted one by one in the order they were added.
+    """
+    link_cards = [None] * len(entries)
+    if SEND_SKEET:
+        print(f"Preparing {len(entries)} link card(s)...\n", flush=True)
+        link_cards = asyncio.run(
+            _prepare_link_cards([entry["url"] for entry in entries])
+        )
+    for i, (entry, link_card) in enumerate(zip(entries, link_cards)):
         section = get_entry_section(readme, entry["entry"])
         formatted_tweet = format_msg_twitter(
             section, entry["title"], entry["url"], entry["description"]
@@ -468,7 +739,14 @@ def main():
         elif not dry_run:
             print("❌🐦 Skipping Tweet as SEND_TWEET is disabled.")
         if SEND_SKEET:
-            skeet_msg(formatted_skeet, entry["url"], dry_run=dry_run)
+            if isinstance(link_card, Exception):
+                raise link_card
+            skeet_msg(
+                formatted_skeet,
+                entry["url"],
+                dry_run=dry_run,
+                link_card=link_card,
+            )
         elif not dry_run:
             print("❌🦋 Skipping Skeet as SEND_SKEET is disabled.")
 
@@ -1,10 +1,15 @@
 """Tests for post_commit."""
 
+import asyncio
 import io
 import os
+import tempfile
+import threading
+import time
 import unittest
 import unittest.mock
 
+import httpx
 from git import Repo
 
 try:
@@ -14,6 +19,18 @@ except ImportError:
     import post_commit as post_commit
 
 
+def mock_http(handler):
+    """Patch the shared HTTP client to answer every request with a handler.
+
+    :param handler: Function taking an httpx.Request and returning the
+        httpx.Response to answer it with.
+    """
+    client = httpx.Client(
+        transport=httpx.MockTransport(handler), follow_redirects=True
+    )
+    return unittest.mock.patch.object(post_commit, "_http_client", client)
+
+
 class TestCommitTweet(unittest.TestCase):
     """Test tweet parsing from commits located in this repo.
 
@@ -780,18 +797,14 @@ class TestDryRun(unittest.TestCase):
             entries[0]["description"],
         )
 
+        og_html = (
+            '<meta property="og:title"'
+            ' content="Test Title">'
+            '<meta property="og:description"'
+            ' content="Test Desc">'
+        )
         with unittest.mock.patch.object(post_commit, "Client") as mock_client:
-            with unittest.mock.patch.object(
-                post_commit.httpx, "get"
-            ) as mock_httpx_get:
-                mock_response = unittest.mock.MagicMock()
-                mock_response.text = (
-                    '<meta property="og:title"'
-                    ' content="Test Title">'
-                    '<meta property="og:description"'
-                    ' content="Test Desc">'
-                )
-                mock_httpx_get.return_value = mock_response
+            with mock_http(lambda request: httpx.Response(200, text=og_html)):
                 post_commit.skeet_msg(skeet, entries[0]["url"], dry_run=True)
             mock_client.assert_not_called()
 
@@ -809,14 +822,17 @@ class TestDryRun(unittest.TestCase):
             entries[0]["description"],
         )
 
-        with unittest.mock.patch.object(
-            post_commit.httpx, "get"
-        ) as mock_httpx_get:
-            mock_response = unittest.mock.MagicMock()
-            mock_response.text = '<meta property="og:title" content="Test">'
-            mock_httpx_get.return_value = mock_response
+        requested = []
+
+        def handler(request):
+            requested.append(str(request.url))
+            return httpx.Response(
+                200, text='<meta property="og:title" content="Test">'
+            )
+
+        with mock_http(handler):
             post_commit.skeet_msg(skeet, entries[0]["url"], dry_run=True)
-            mock_httpx_get.assert_called_once_with(entries[0]["url"])
+        self.assertEqual(requested, [entries[0]["url"]])
 
     def test_skeet_msg_dry_run_prints_embed_info(self):
         """skeet_msg dry_run=True prints embed info with OG tags."""
@@ -833,23 +849,15 @@ class TestDryRun(unittest.TestCase):
             entries[0]["description"],
         )
 
-        with unittest.mock.patch.object(
-            post_commit.httpx, "get"
-        ) as mock_httpx_get, unittest.mock.patch.object(
-            post_commit.httpx, "head"
-        ) as mock_httpx_head:
-            mock_response = unittest.mock.MagicMock()
-            mock_response.text = (
-                '<meta property="og:title"'
-                ' content="OG Title">'
-                '<meta property="og:description"'
-                ' content="OG Desc">'
-                '<meta property="og:image"'
-                ' content="https://example.com/img.png">'
-            )
-            mock_httpx_get.return_value = mock_response
-            mock_httpx_head.return_value = unittest.mock.MagicMock()
-
+        og_html = (
+            '<meta property="og:title"'
+            ' content="OG Title">'
+            '<meta property="og:description"'
+            ' content="OG Desc">'
+            '<meta property="og:image"'
+            ' content="https://example.com/img.png">'
+        )
+        with mock_http(lambda request: httpx.Response(200, text=og_html)):
             f = io.StringIO()
             with redirect_stdout(f):
                 post_commit.skeet_msg(skeet, entries[0]["url"], dry_run=True)
@@ -958,6 +966,36 @@ class TestCompressImage(unittest.TestCase):
                     len(result_data), post_commit.BLUESKY_MAX_BLOB_SIZE
                 )
 
+    @unittest.mock.patch("sys.stdout", new_callable=io.StringIO)
+    def test_compressed_image_fits_bluesky_thumbnail(self, mock_stdout):
+        """Images are scaled down to the thumbnail size shown by BlueSky."""
+        from PIL import Image as PILImage
+
+        img_data = self._make_image("JPEG", noise=True)
+        result_data, _ = post_commit._compress_image(img_data)
+
+        result = PILImage.open(io.BytesIO(result_data))
+        self.assertEqual(result.format, "JPEG")
+        self.assertEqual(
+            result.size,
+            (
+                post_commit.BLUESKY_THUMB_MAX_SIZE,
+                post_commit.BLUESKY_THUMB_MAX_SIZE,
+            ),
+        )
+
+    @unittest.mock.patch("sys.stdout", new_callable=io.StringIO)
+    def test_compress_image_lowers_quality_for_small_limits(self, mock_stdout):
+        """A tight size limit is reached trading quality for fewer pixels."""
+        img_data = self._make_image("PNG", noise=True)
+        result_data, _ = post_commit._compress_image(img_data, 100_000)
+
+        self.assertLessEqual(len(result_data), 100_000)
+        self.assertIn(
+            f"at quality {post_commit.JPEG_MIN_QUALITY}",
+            mock_stdout.getvalue(),
+        )
+
     @unittest.mock.patch("sys.stdout", new_callable=io.StringIO)
     def test_skeet_msg_compresses_large_og_image(self, mock_stdout):
         """skeet_msg compresses an oversized og:image via _compress_image."""
@@ -971,28 +1009,25 @@ class TestCompressImage(unittest.TestCase):
             len(large_img_bytes), post_commit.BLUESKY_MAX_BLOB_SIZE
         )
 
-        with unittest.mock.patch.object(
-            post_commit.httpx, "get"
-        ) as mock_get, unittest.mock.patch.object(
-            post_commit, "_compress_image", wraps=post_commit._compress_image
-        ) as mock_compress:
-            mock_page = unittest.mock.MagicMock()
-            mock_page.text = (
-                '<meta property="og:title" content="Title">'
-                '<meta property="og:description" content="Desc">'
-                '<meta property="og:image"'
-                ' content="https://example.com/big.png">'
-            )
-            mock_img = unittest.mock.MagicMock()
-            mock_img.content = large_img_bytes
-            mock_img.headers = {"content-type": "image/png"}
+        og_html = (
+            '<meta property="og:title" content="Title">'
+            '<meta property="og:description" content="Desc">'
+            '<meta property="og:image"'
+            ' content="https://example.com/big.png">'
+        )
 
-            def get_side_effect(url, **kwargs):
-                if "example.com/big.png" in url:
-                    return mock_img
-                return mock_page
+        def handler(request):
+            if request.url == "https://example.com/big.png":
+                return httpx.Response(
+                    200,
+                    content=large_img_bytes,
+                    headers={"content-type": "image/png"},
+                )
+            return httpx.Response(200, text=og_html)
 
-            mock_get.side_effect = get_side_effect
+        with mock_http(handler), unittest.mock.patch.object(
+            post_commit, "_compress_image", wraps=post_commit._compress_image
+        ) as mock_compress:
             post_commit.skeet_msg(
                 text_builder, "https://example.com", dry_run=True
             )
@@ -1031,23 +1066,16 @@ class TestOgTagFixes(unittest.TestCase):
             "<meta property='og:image' content='/images/share.png'>"
         )
 
-        with unittest.mock.patch.object(post_commit.httpx, "get") as mock_get:
-            mock_page = unittest.mock.MagicMock()
-            mock_page.text = og_html
-            mock_page.raise_for_status.return_value = None
-
-            mock_img = unittest.mock.MagicMock()
-            mock_img.content = b"\x89PNG\r\n\x1a\nimg"
-            mock_img.headers = {"content-type": "application/octet-stream"}
-            mock_img.raise_for_status.return_value = None
-
-            def get_side_effect(url, **kwargs):
-                if url == "https://example.com/images/share.png":
-                    return mock_img
-                return mock_page
-
-            mock_get.side_effect = get_side_effect
+        def handler(request):
+            if request.url == "https://example.com/images/share.png":
+                return httpx.Response(
+                    200,
+                    content=b"\x89PNG\r\n\x1a\nimg",
+                    headers={"content-type": "application/octet-stream"},
+                )
+            return httpx.Response(200, text=og_html)
 
+        with mock_http(handler):
             img_data, img_content_type, img_url, title, description = (
                 post_commit._get_og_tags(page_url)
             )
@@ -1085,16 +1113,7 @@ class TestOgTagFixes(unittest.TestCase):
             '<meta property="og:image"'
             ' content="https://example.com/real-image.png">'
         )
-        with unittest.mock.patch.object(
-            post_commit.httpx, "get"
-        ) as mock_get, unittest.mock.patch.object(
-            post_commit.httpx, "head"
-        ) as mock_head:
-            mock_page = unittest.mock.MagicMock()
-            mock_page.text = og_html
-            mock_get.return_value = mock_page
-            mock_head.return_value = unittest.mock.MagicMock()
-
+        with mock_http(lambda request: httpx.Response(200, text=og_html)):
             post_commit.skeet_msg(skeet, entries[0]["url"], dry_run=True)
 
         output = mock_stdout.getvalue()
@@ -1128,16 +1147,7 @@ class TestOgTagFixes(unittest.TestCase):
             '<meta property="og:image"'
             ' content="/packs/media/images/courses.png">'
         )
-        with unittest.mock.patch.object(
-            post_commit.httpx, "get"
-        ) as mock_get, unittest.mock.patch.object(
-            post_commit.httpx, "head"
-        ) as mock_head:
-            mock_page = unittest.mock.MagicMock()
-            mock_page.text = og_html
-            mock_get.return_value = mock_page
-            mock_head.return_value = unittest.mock.MagicMock()
-
+        with mock_http(lambda request: httpx.Response(200, text=og_html)):
             post_commit.skeet_msg(skeet, page_url, dry_run=True)
 
         output = mock_stdout.getvalue()
@@ -1166,17 +1176,7 @@ class TestOgTagFixes(unittest.TestCase):
             entries[0]["description"],
         )
 
-        with unittest.mock.patch.object(post_commit.httpx, "get") as mock_get:
-            mock_response = unittest.mock.MagicMock()
-            mock_response.raise_for_status.side_effect = (
-                post_commit.httpx.HTTPStatusError(
-                    "403 Forbidden",
-                    request=unittest.mock.MagicMock(),
-                    response=unittest.mock.MagicMock(),
-                )
-            )
-            mock_get.return_value = mock_response
-
+        with mock_http(lambda request: httpx.Response(403)):
             # Should not raise an exception
             post_commit.skeet_msg(skeet, entries[0]["url"], dry_run=True)
 
@@ -1208,21 +1208,13 @@ class TestOgTagFixes(unittest.TestCase):
             '<meta property="og:image"'
             ' content="https://example.com/broken.png">'
         )
-        with unittest.mock.patch.object(post_commit.httpx, "get") as mock_get:
-            mock_page = unittest.mock.MagicMock()
-            mock_page.text = og_html
 
-            def get_side_effect(url, **kwargs):
-                if url == "https://example.com/broken.png":
-                    raise post_commit.httpx.HTTPStatusError(
-                        "404 Not Found",
-                        request=unittest.mock.MagicMock(),
-                        response=unittest.mock.MagicMock(),
-                    )
-                return mock_page
-
-            mock_get.side_effect = get_side_effect
+        def handler(request):
+            if request.url == "https://example.com/broken.png":
+                return httpx.Response(404)
+            return httpx.Response(200, text=og_html)
 
+        with mock_http(handler):
             post_commit.skeet_msg(skeet, entries[0]["url"], dry_run=True)
 
         output = mock_stdout.getvalue()
@@ -1231,6 +1223,326 @@ class TestOgTagFixes(unittest.TestCase):
         self.assertIn("Image type: None", output)
 
 
+class TestHttpClient(unittest.TestCase):
+    """Test the shared HTTP client and its download size limits."""
+
+    def test_client_shared_until_closed(self):
+        """The same client is used for every request until it is closed."""
+        with unittest.mock.patch.object(post_commit, "_http_client", None):
+            client = post_commit.get_http_client()
+            self.assertIs(post_commit.get_http_client(), client)
+            post_commit.close_http_client()
+            self.assertTrue(client.is_closed)
+            self.assertIsNone(post_commit._http_client)
+
+    def test_html_over_limit_is_truncated(self):
+        """A page over the HTML limit is cut short but still parsed."""
+        og_html = (
+            '<html><head><meta property="og:title" content="Big page">'
+            '<meta property="og:description" content="Desc"></head>'
+            "<body>" + "x" * 5000 + "</body></html>"
+        )
+        requested = []
+
+        def handler(request):
+            requested.append(str(request.url))
+            return httpx.Response(200, text=og_html)
+
+        with mock_http(handler), unittest.mock.patch.object(
+            post_commit, "MAX_HTML_BYTES", 1000
+        ):
+            _, _, img_url, title, description = post_commit._get_og_tags(
+                "https://example.com"
+            )
+
+        self.assertEqual(title, "Big page")
+        self.assertEqual(description, "Desc")
+        self.assertIsNone(img_url)
+        self.assertEqual(requested, ["https://example.com"])
+
+    @unittest.mock.patch("sys.stdout", new_callable=io.StringIO)
+    def test_image_over_limit_not_downloaded(self, mock_stdout):
+        """An og:image over the image limit is not used."""
+        og_html = (
+            '<meta property="og:title" content="Title">'
+            '<meta property="og:image" content="https://example.com/i.png">'
+        )
+
+        def handler(request):
+            if request.url == "https://example.com/i.png":
+                return httpx.Response(200, content=b"\x89PNG" + b"0" * 5000)
+            return httpx.Response(200, text=og_html)
+
+        with mock_http(handler), unittest.mock.patch.object(
+            post_commit, "MAX_IMAGE_BYTES", 1000
+        ):
+            img_data, img_content_type, img_url, _, _ = (
+                post_commit._get_og_tags("https://example.com")
+            )
+
+        self.assertIsNone(img_data)
+        self.assertIsNone(img_content_type)
+        self.assertEqual(img_url, "https://example.com/i.png")
+        self.assertIn("og:image too large", mock_stdout.getvalue())
+
+
+class TestReadHeadMetaTags(unittest.TestCase):
+    """Test the streaming parser of the meta tags in a page <head>."""
+
+    def read_chunks(self, chunks):
+        """Parse the chunks, returning the meta tags and chunks consumed."""
+        consumed = []
+
+        def stream():
+            for chunk in chunks:
+                consumed.append(chunk)
+                yield chunk
+
+        meta_tags = post_commit._read_head_meta_tags(stream(), "utf-8")
+        return meta_tags, len(consumed)
+
+    def test_stops_reading_at_head_end(self):
+        """Nothing after </head> is read, or parsed."""
+        meta_tags, consumed = self.read_chunks(
+            [
+                b'<html><head><meta property="og:title" content="T">',
+                b"</head><body>",
+                b'<meta property="og:image" content="in-body.png">',
+                b"</body></html>",
+            ]
+        )
+        self.assertEqual(meta_tags, [{"property": "og:title", "content": "T"}])
+        self.assertEqual(consumed, 2)
+
+    def test_stops_reading_when_card_properties_found(self):
+        """Reading stops once og:image, og:title and og:description exist."""
+        meta_tags, consumed = self.read_chunks(
+            [
+                b'<head><meta property="og:title" content="T">',
+                b'<meta property="og:description" content="D">'
+                b'<meta property="og:image" content="i.png">',
+                b'<meta name="twitter:title" content="Other">',
+                b"</head>",
+            ]
+        )
+        self.assertEqual(len(meta_tags), 3)
+        self.assertEqual(consumed, 2)
+
+    def test_tags_and_characters_split_across_chunks(self):
+        """Tags and multi-byte characters can be split between chunks."""
+        html = '<head><meta property="og:title" content="Caf\u00e9 \u2615">'
+        data = html.encode("utf-8")
+        # Split inside the tag and inside the multi-byte characters
+        split_at = (20, data.index(b"\xc3") + 1, data.index(b"\xe2") + 2)
+        chunks = [
+            data[start:end]
+            for start, end in zip((0,) + split_at, split_at + (len(data),))
+        ]
+        meta_tags, _ = self.read_chunks(chunks + [b"</head>"])
+        self.assertEqual(
+            meta_tags,
+            [{"property": "og:title", "content": "Caf\u00e9 \u2615"}],
+        )
+
+
+class TestPostEntries(unittest.TestCase):
+    """Test posting several entries with their link cards prepared at once."""
+
+    @staticmethod
+    def slow_pages(delay):
+        """Return a handler answering each page after a delay."""
+
+        def handler(request):
+            time.sleep(delay)
+            title = request.url.path.strip("/")
+            return httpx.Response(
+                200,
+                text=f'<meta property="og:title" content="{title}">'
+                '<meta property="og:description" content="Desc"></head>',
+            )
+
+        return handler
+
+    def test_link_cards_prepared_concurrently_in_order(self):
+        """Slow pages are fetched at the same time, results keep order."""
+        urls = [f"https://example.com/page{i}" for i in range(4)]
+
+        with mock_http(self.slow_pages(0.5)):
+            started = time.monotonic()
+            link_cards = asyncio.run(post_commit._prepare_link_cards(urls))
+            elapsed = time.monotonic() - started
+
+        self.assertEqual(
+            [title for _, _, _, title, _ in link_cards],
+            ["page0", "page1", "page2", "page3"],
+        )
+        self.assertLess(elapsed, 1.5)
+
+    def test_link_cards_share_one_http_client(self):
+        """Concurrent fetches create a single shared client between them."""
+        urls = [f"https://example.com/page{i}" for i in range(8)]
+        real_client = httpx.Client
+        transport = httpx.MockTransport(self.slow_pages(0.1))
+
+        def make_client(**kwargs):
+            # Widen the window for threads racing to create the client
+            time.sleep(0.05)
+            return real_client(transport=transport, **kwargs)
+
+        with unittest.mock.patch.object(
+            post_commit, "_http_client", None
+        ), unittest.mock.patch.object(
+            post_commit.httpx, "Client", side_effect=make_client
+        ) as mock_client:
+            try:
+                link_cards = asyncio.run(post_commit._prepare_link_cards(urls))
+            finally:
+                post_commit.close_http_client()
+
+        mock_client.assert_called_once()
+        self.assertEqual(
+            [title for _, _, _, title, _ in link_cards],
+            [f"page{i}" for i in range(8)],
+        )
+
+    def test_link_card_fetches_limited_to_http_connections(self):
+        """No more pages are fetched at once than the client connections."""
+        max_connections = post_commit.HTTP_LIMITS.max_connections
+        urls = [
+            f"https://example.com/page{i}" for i in range(max_connections + 5)
+        ]
+        lock = threading.Lock()
+        in_flight = [0, 0]
+        slow_page = self.slow_pages(0.2)
+
+        def handler(request):
+            with lock:
+                in_flight[0] += 1
+                in_flight[1] = max(in_flight)
+            try:
+                return slow_page(request)
+            finally:
+                with lock:
+                    in_flight[0] -= 1
+
+        with mock_http(handler):
+            link_cards = asyncio.run(post_commit._prepare_link_cards(urls))
+
+        self.assertEqual(len(link_cards), len(urls))
+        self.assertEqual(in_flight[1], max_connections)
+
+    @unittest.mock.patch("sys.stdout", new_callable=io.StringIO)
+    def test_post_entries_in_order(self, mock_stdout):
+        """Entries are posted in the order they were added to the list."""
+        entries = [
+            {
+                "entry": f"- [Entry {i}](https://example.com/page{i}) - Desc.",
+                "title": f"Entry {i}",
+                "url": f"https://example.com/page{i}",
+                "description": "Desc.",
+            }
+            for i in range(3)
+        ]
+        readme = "## Section\n\n" + "\n".join(e["entry"] for e in entries)
+
+        with mock_http(self.slow_pages(0.1)):
+            post_commit.post_entries(entries, readme, dry_run=True)
+
+        output = mock_stdout.getvalue()
+        positions = [output.index(f"Title: page{i}") for i in range(3)]
+        self.assertEqual(positions, sorted(positions))
+        self.assertLess(
+            output.index("Posting #0"), output.index("Title: page0")
+        )
+
+
+class TestBlueskySession(unittest.TestCase):
+    """Test the BlueSky client shared across posts and runs."""
+
+    def setUp(self):
+        """Start without a client and with an empty session directory."""
+        post_commit._bluesky_client = None
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.session_file = os.path.join(self.tmp_dir.name, "session.txt")
+        patcher = unittest.mock.patch.multiple(
+            post_commit,
+            BLUESKY_USERNAME="user.bsky.social",
+            BLUESKY_TOKEN="app-token",
+            BLUESKY_SESSION_FILE=self.session_file,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.tmp_dir.cleanup)
+
+    def tearDown(self):
+        """Do not leak the mocked client to other tests."""
+        post_commit._bluesky_client = None
+
+    def test_logs_in_once_per_run(self):
+        """The client is created and logged in only for the first post."""
+        with unittest.mock.patch.object(post_commit, "Client") as mock_client:
+            first = post_commit.get_bluesky_client()
+            second = post_commit.get_bluesky_client()
+
+        self.assertIs(first, second)
+        mock_client.assert_called_once()
+        first.login.assert_called_once_with("user.bsky.social", "app-token")
+
+    def test_restores_saved_session(self):
+        """A saved session is used instead of logging in with the token."""
+        with open(self.session_file, "w") as f:
+            f.write("saved-session\n")
+
+        with unittest.mock.patch.object(post_commit, "Client") as mock_client:
+            mock_client.return_value.login.return_value.handle = (
+                "user.bsky.social"
+            )
+            client = post_commit.get_bluesky_client()
+
+        client.login.assert_called_once_with(session_string="saved-session")
+
+    @unittest.mock.patch("sys.stdout", new_callable=io.StringIO)
+    def test_expired_saved_session_logs_in_again(self, mock_stdout):
+        """If the saved session cannot be refreshed the token is used."""
+        with open(self.session_file, "w") as f:
+            f.write("expired-session")
+
+        with unittest.mock.patch.object(post_commit, "Client") as mock_client:
+            mock_client.return_value.login.side_effect = [
+                Exception("ExpiredToken"),
+                unittest.mock.Mock(),
+            ]
+            client = post_commit.get_bluesky_client()
+
+        self.assertEqual(
+            client.login.call_args_list,
+            [
+                unittest.mock.call(session_string="expired-session"),
+                unittest.mock.call("user.bsky.social", "app-token"),
+            ],
+        )
+        self.assertIn("logging in again", mock_stdout.getvalue())
+
+    def test_session_saved_when_created_or_refreshed(self):
+        """New and refreshed sessions are written, imported ones are not."""
+        session = unittest.mock.Mock()
+        session.export.return_value = "new-session"
+
+        post_commit._save_bluesky_session(
+            post_commit.SessionEvent.IMPORT, session
+        )
+        self.assertFalse(os.path.exists(self.session_file))
+
+        for event in (
+            post_commit.SessionEvent.CREATE,
+            post_commit.SessionEvent.REFRESH,
+        ):
+            post_commit._save_bluesky_session(event, session)
+            with open(self.session_file) as f:
+                self.assertEqual(f.read(), "new-session")
+            os.remove(self.session_file)
+
+
 if __name__ == "__main__":
     # Project root is up 3 levels from this file
     project_root_dir = os.path.dirname(
@@ -9,13 +9,26 @@ Uses async requests for fast parallel checking.
 # ///
 import argparse
 import asyncio
+import contextvars
+import glob
+import hashlib
+import json
 import os
+import random
 import re
+import subprocess
 import sys
+import time
 import tomllib
-from functools import lru_cache
+from abc import ABC, abstractmethod
+from bisect import bisect_right
+from collections import deque
+from dataclasses import asdict, dataclass, replace
+from email.utils import parsedate_to_datetime
+from http import HTTPStatus
 from pathlib import Path
-from typing import List, Tuple, Optional, Set
+from typing import AsyncIterator, Awaitable, Callable, Deque, Dict, List, NamedTuple, Tuple, Optional, Sequence, Set, TypeVar
+from urllib.parse import urlsplit, urlunsplit
 
 import httpx
 
@@ -35,190 +48,1817 @@ def load_ignore_lists() -> Tuple[Set[str], Set[str]]:
     return set(), set()
 
 
-# Load ignore lists only once at module level
-REDIRECT_IGNORE, ERROR_IGNORE = load_ignore_lists()
+def load_allow_list(path: Path) -> Set[str]:
+    """
+    Load an allow list of domains/URLs whose errors are ignored, in the
+    comma (or newline) separated format used by awesome_bot's --white-list.
+    """
+    text = path.read_text(encoding='utf-8')
+    return {entry.strip() for entry in re.split(r'[,\s]+', text) if entry.strip()}
+
+
+class IgnoreMatcher:
+    """
+    Index of ignore rules, compiled once and matched in near-constant time.
+
+    Each rule is one of:
+    - a bare host name (``"youtube.com"``), matching that host and all its
+      subdomains (``www.youtube.com``, ``m.youtube.com``, ...);
+    - a URL without a query (``"https://python.microbit.org"`` or
+      ``"https://vittascience.com/microbit/"``), matching every URL on that
+      exact host whose path starts with the rule path;
+    - a URL with a query (``"https://example.com/page?id=1"``), matching only
+      that exact URL.
+    The URL scheme and fragment are not taken into account.
+    """
+
+    def __init__(self, rules: Set[str] = frozenset()):
+        self.exact: Set[str] = set()
+        self.host_suffixes: Set[str] = set()
+        # host -> set of path prefixes, and the distinct prefix lengths
+        self.path_prefixes: Dict[str, Set[str]] = {}
+        self._prefix_lengths: Dict[str, Set[int]] = {}
+        for rule in rules:
+            self.add(rule)
+
+    @staticmethod
+    def _key(host: str, path: str, query: str) -> str:
+        return f"{host}{path or '/'}?{query}" if query else f"{host}{path or '/'}"
+
+    def add(self, rule: str) -> None:
+        """Compile a single rule into the index."""
+        rule = rule.strip()
+        if not rule:
+            return
+        if '://' not in rule:
+            self.host_suffixes.add(rule.lower().strip('.'))
+            return
+        parts = urlsplit(rule)
+        host = (parts.hostname or '').lower()
+        if parts.query:
+            self.exact.add(self._key(host, parts.path, parts.query))
+        else:
+            path = parts.path or '/'
+            self.path_prefixes.setdefault(host, set()).add(path)
+            self._prefix_lengths.setdefault(host, set()).add(len(path))
+
+    def __len__(self) -> int:
+        return (len(self.exact) + len(self.host_suffixes)
+                + sum(len(prefixes) for prefixes in self.path_prefixes.values()))
+
+    def matches(self, url: str) -> bool:
+        """Check if a URL is covered by any rule."""
+        try:
+            parts = urlsplit(url)
+            host = (parts.hostname or '').lower()
+        except ValueError:
+            return False
+        if not host:
+            return False
+        # Host suffixes: one set lookup per label of the host name
+        labels = host.split('.')
+        for i in range(len(labels)):
+            if '.'.join(labels[i:]) in self.host_suffixes:
+                return True
+        path = parts.path or '/'
+        prefixes = self.path_prefixes.get(host)
+        if prefixes:
+            for length in self._prefix_lengths[host]:
+                if path[:length] in prefixes:
+                    return True
+        return bool(self.exact) and self._key(host, path, parts.query) in self.exact
+
+
+# Load and compile the ignore lists only once at module level
+REDIRECT_IGNORE, ERROR_IGNORE = (IgnoreMatcher(rules) for rules in load_ignore_lists())
 
 
 def should_ignore_redirect(url: str) -> bool:
     """Check if a URL redirect should be ignored based on exception list."""
-    if url in REDIRECT_IGNORE:
-        return True
-    return any(ignore_domain in url for ignore_domain in REDIRECT_IGNORE)
+    return REDIRECT_IGNORE.matches(url)
 
 
 def should_ignore_error(url: str) -> bool:
     """Check if a URL error should be ignored based on exception list."""
-    if url in ERROR_IGNORE:
-        return True
-    return any(ignore_domain in url for ignore_domain in ERROR_IGNORE)
+    return ERROR_IGNORE.matches(url)
+
 
+class UrlOccurrence(NamedTuple):
+    """Position of a URL in a Markdown file (1-based line and column)."""
+    file: str
+    line: int
+    column: int
 
-def extract_urls_from_markdown(text: str) -> List[str]:
+
+UrlIndex = Dict[str, List[UrlOccurrence]]
+
+
+# URLs are found by their scheme, which the regex engine searches for fast.
+# What precedes a URL tells which kind of link it is in, and the kind decides
+# where the URL ends. Possessive quantifiers keep every match linear.
+_URL_SCHEME_PATTERN = re.compile(r'https?://')
+_URL_BODY_PATTERNS = {
+    # [text](url), with balanced parentheses as in wiki/Foo_(bar)
+    'inline': re.compile(r'(?:[^\s()<>]|\([^\s()<>]*+\))++'),
+    # <url> and [text](<url>)
+    'angle': re.compile(r'[^\s<>]++(?=>)'),
+    # [label]: url
+    'reference': re.compile(r'[^\s<>]++'),
+    # Anything else, stopping before the ]( or ][ of a link whose text is a URL
+    'bare': re.compile(r'(?:[^\s<>\]]|\](?![(\[]))++'),
+}
+
+
+def _url_kind(text: str, start: int, floor: int) -> str:
     """
-    Extract URLs from Markdown file, handling inline links and plain URLs,
-    and intelligently trimming surrounding punctuation or brackets.
-    Returns a list of unique URLs.
+    Which kind of link the URL at `start` is in, looking back no further
+    than `floor` (the end of the previous URL).
     """
-    urls = []
-    seen = set()
-
-    # Match Markdown inline links: [text](URL)
-    inline_link_pattern = re.compile(r'\[.*?\]\((https?://[^\s<>)]+)\)')
-    for match in inline_link_pattern.finditer(text):
-        url = match.group(1).rstrip('.,;:!?\'")')
-        if url not in seen:
-            urls.append(url)
-            seen.add(url)
+    before = text[floor:start]
+    angle = before.endswith('<')
+    before = before.removesuffix('<').rstrip()
+    if before.endswith(']('):
+        return 'angle' if angle else 'inline'
+    if before.endswith(']:'):
+        return 'reference'
+    return 'angle' if angle else 'bare'
 
-    # Match plain URLs (not already captured by inline links)
-    url_pattern = re.compile(r'https?://[^\s<>]+')
-    for match in url_pattern.finditer(text):
-        url = match.group()
-        start, end = match.start(), match.end()
 
-        # Look at surrounding characters
-        before = text[start-1] if start > 0 else ''
-        after = text[end] if end < len(text) else ''
+# Characters ending a sentence rather than a bare URL
+_TRAILING_PUNCTUATION = frozenset('.,;:!?\'"*_~')
+_CLOSING_BRACKETS = {')': '(', ']': '[', '}': '{'}
 
-        # Trim enclosing parentheses, brackets, or braces if they appear to be outside the URL
-        if after in [')', ']', '}'] and before in ['(', '[', '{']:
-            url = url[:-1]
 
-        # Trim common trailing punctuation
-        url = url.rstrip('.,;:!?\'")')
+def _trim_bare_url(url: str) -> str:
+    """
+    Trim the trailing punctuation of a bare URL, and closing brackets that
+    are not balanced by an opening one within the URL, e.g. (see http://x.y).
+    """
+    unbalanced = {close: url.count(close) - url.count(open_) for close, open_ in _CLOSING_BRACKETS.items()}
+    end = len(url)
+    while end:
+        last = url[end - 1]
+        if last in _TRAILING_PUNCTUATION:
+            end -= 1
+        elif unbalanced.get(last, 0) > 0:
+            unbalanced[last] -= 1
+            end -= 1
+        else:
+            break
+    return url[:end]
 
-        if url not in seen:
-            urls.append(url)
-            seen.add(url)
 
+def extract_urls_from_markdown(text: str, file: str = '') -> UrlIndex:
+    """
+    Extract URLs from Markdown text in a single pass: inline links and
+    images, autolinks, reference-style link definitions and bare URLs.
+    Link destinations are taken as written, bare URLs have surrounding
+    punctuation or brackets trimmed.
+    Returns a dictionary of unique URLs (in order of discovery) to every
+    place they appear in the text.
+    """
+    urls: UrlIndex = {}
+    line = 1
+    line_start = 0
+    end = 0
+    while match := _URL_SCHEME_PATTERN.search(text, end):
+        offset = match.start()
+        kind = _url_kind(text, offset, end)
+        # Only the text since the previous URL is looked at for new lines
+        newline = text.rfind('\n', end, offset)
+        if newline != -1:
+            line += text.count('\n', end, newline + 1)
+            line_start = newline + 1
+        body = _URL_BODY_PATTERNS[kind].match(text, match.end())
+        if body is None and kind == 'angle':
+            # Not closed by a >, so just a URL after a <
+            kind = 'bare'
+            body = _URL_BODY_PATTERNS[kind].match(text, match.end())
+        if body is None:
+            end = match.end()
+            continue
+        end = body.end()
+        url = text[offset:end]
+        if kind == 'bare':
+            url = _trim_bare_url(url)
+        urls.setdefault(url, []).append(UrlOccurrence(file, line, offset - line_start + 1))
     return urls
 
 
-@lru_cache()
-def _split_lines(text: str) -> tuple[str, ...]:
-    """Cache the split lines operation since we use the same text repeatedly."""
-    return tuple(text.split('\n'))
+_HUNK_HEADER_PATTERN = re.compile(r'^@@ -\d+(?:,\d+)? \+(\d+)(?:,\d+)? @@')
+
+
+def extract_urls_from_diff(diff_text: str, file: str = '') -> UrlIndex:
+    """
+    Extract URLs from the lines added or modified in a unified diff.
+
+    Line numbers refer to the new version of the file.
+    """
+    urls: UrlIndex = {}
+    new_line = 0
+    for diff_line in diff_text.splitlines():
+        hunk = _HUNK_HEADER_PATTERN.match(diff_line)
+        if hunk:
+            new_line = int(hunk.group(1))
+        elif diff_line.startswith('+') and not diff_line.startswith('+++'):
+            for url, occurrences in extract_urls_from_markdown(diff_line[1:], file).items():
+                urls.setdefault(url, []).extend(
+                    o._replace(line=new_line) for o in occurrences)
+            new_line += 1
+        elif diff_line.startswith(' '):
+            new_line += 1
+    return urls
 
 
-def find_line_number(text: str, url: str) -> int:
-    """Find the line number where a URL first appears in the text."""
-    lines = _split_lines(text)
-    for line_num, line in enumerate(lines, 1):
-        if url in line:
-            return line_num
-    return 0
+def git_diff(diff_range: str, file: str) -> str:
+    """Return the zero-context git diff of a file for a revision range."""
+    return subprocess.run(
+        ['git', 'diff', '--unified=0', '--no-color', '--no-ext-diff', diff_range, '--', file],
+        check=True, capture_output=True, text=True, encoding='utf-8',
+    ).stdout
 
 
-def create_github_line_link(line_num: int, markdown_file: str) -> str:
+def create_github_line_link(line_num: int, markdown_file: str, show_file: bool = False) -> str:
     """Create a GitHub link to a specific line in a file, or just the line number if not in GitHub Actions."""
     github_server = os.getenv('GITHUB_SERVER_URL', 'https://github.com')
     github_repo = os.getenv('GITHUB_REPOSITORY', '')
     github_sha = os.getenv('GITHUB_SHA', '')
+    label = f"{markdown_file} L{line_num}" if show_file else f"L{line_num}"
 
     if github_repo and github_sha:
         file_link = f"{github_server}/{github_repo}/blob/{github_sha}/{markdown_file}?plain=1#L{line_num}"
-        return f"[L{line_num}]({file_link})"
+        return f"[{label}]({file_link})"
     else:
-        return f"L{line_num}"
+        return label
+
+
+def format_occurrences(occurrences: List[UrlOccurrence], link: bool = False,
+                       show_file: bool = False) -> str:
+    """
+    Format the lines where a URL appears, optionally as GitHub links (only
+    labelled with the file name if `show_file`, when checking several files).
+    """
+    if link:
+        return ", ".join(create_github_line_link(o.line, o.file, show_file) for o in occurrences)
+    return ", ".join(f"{o.file}:{o.line}:{o.column}" for o in occurrences)
+
+
+def expand_markdown_paths(patterns: Sequence[str]) -> List[str]:
+    """
+    Expand the globs (** matching any number of directories) among the
+    given paths, keeping the order given and dropping duplicates. Plain
+    paths are kept as they are, so that a missing file is still reported.
+    """
+    files: Dict[str, None] = {}
+    for pattern in patterns:
+        if not re.search(r'[*?[]', pattern):
+            files[pattern] = None
+            continue
+        matches = sorted(glob.glob(pattern, recursive=True))
+        if not matches:
+            print(f"⚠️  No files match {pattern}")
+        files.update(dict.fromkeys(m for m in matches if os.path.isfile(m)))
+    return list(files)
+
+
+@dataclass
+class CheckResult:
+    """Outcome of checking a single URL."""
+    index: int
+    url: str
+    final_url: Optional[str] = None
+    error: Optional[str] = None
+    status: Optional[int] = None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    cached: bool = False
+    # Set to the URL's own origin (scheme, host and port) when it could not
+    # be connected to (DNS, TCP, TLS)
+    unreachable_origin: Optional[str] = None
+    timed_out: bool = False
+    # Set when the time budget ran out before the URL could be checked
+    not_checked: bool = False
+    # Seconds spent per phase, see RequestTrace
+    timings: Optional[Dict[str, float]] = None
+    # Seconds the server asked to wait before retrying (Retry-After)
+    retry_after: Optional[float] = None
+    # The other spelling of the same resource whose verdict this one got,
+    # when it was not requested itself
+    same_as: Optional[str] = None
+
+
+def normalize_url(url: str) -> str:
+    """
+    Normalise a URL for use as a cache key.
+
+    Lowercases the scheme and host, drops default ports and the fragment.
+    """
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    port = parts.port
+    if port and (scheme, port) not in (('http', 80), ('https', 443)):
+        host = f"{host}:{port}"
+    if parts.username or parts.password:
+        host = f"{parts.username or ''}:{parts.password or ''}@{host}"
+    return urlunsplit((scheme, host, parts.path or '/', parts.query, ''))
+
+
+def canonical_url(url: str) -> str:
+    """
+    Key identifying the resource behind a URL, shared by all its usual
+    spellings: http and https, with or without `www.` and a trailing slash,
+    any fragment and any host case.
+    """
+    parts = urlsplit(normalize_url(url))
+    host = parts.netloc.removeprefix('www.')
+    path = parts.path.rstrip('/')
+    return urlunsplit(('', host, path, parts.query, ''))
+
+
+def group_equivalent_urls(urls: Sequence[str]) -> Dict[str, List[str]]:
+    """
+    Group the URLs that are spellings of the same resource (see
+    canonical_url()), so that each resource is usually checked once.
+
+    :returns: The spellings of each group in the order to check them,
+        preferring https and then the order they were found in, keyed by the
+        first one
+    """
+    groups: Dict[str, List[str]] = {}
+    for url in urls:
+        groups.setdefault(canonical_url(url), []).append(url)
+    ordered = (sorted(spellings, key=lambda url: not url.lower().startswith('https:'))
+               for spellings in groups.values())
+    return {spellings[0]: spellings for spellings in ordered}
+
+
+def check_failed(result: CheckResult) -> bool:
+    """Whether a URL was checked and found broken (an error or error status)."""
+    return bool(result.error or (result.status or 0) >= 400)
+
+
+def fan_out_result(checked: Dict[str, CheckResult], spellings: List[str],
+                   indices: Dict[str, int]) -> List[CheckResult]:
+    """
+    Give every spelling of a resource a verdict.
+
+    The spellings are checked in turn until one works (see main()). Those
+    checked keep their own result, and the rest get the verdict of the last
+    one checked, noted with `same_as`. As they were not requested, they are
+    never reported as redirects. Request timings stay with the checked URLs
+    only.
+    """
+    result = checked[[url for url in spellings if url in checked][-1]]
+    fanned = []
+    for url in spellings:
+        if url in checked:
+            fanned.append(replace(checked[url], index=indices[url]))
+        else:
+            fanned.append(replace(result, index=indices[url], url=url, final_url=None,
+                                  timings=None, same_as=result.url))
+    return fanned
+
+
+DEFAULT_CACHE_TTL_HOURS = 7 * 24
+
+
+class LinkCache:
+    """
+    Persistent JSON cache of successful link checks, keyed by normalised URL.
+
+    Each entry stores the final status, the redirect target (if any), the
+    ETag/Last-Modified validators and the time of the check. Entries younger
+    than their TTL are reused without a request, older ones are revalidated
+    with a conditional request. Errors are never cached so that they are
+    always re-checked.
+    """
+    VERSION = 1
+
+    def __init__(self, path: Optional[Path], ttl_hours: float = DEFAULT_CACHE_TTL_HOURS):
+        self.path = path
+        self.ttl = ttl_hours * 3600
+        self.entries: Dict[str, dict] = {}
+        if path and path.exists():
+            try:
+                data = json.loads(path.read_text(encoding='utf-8'))
+            except (OSError, ValueError) as e:
+                print(f"⚠️  Ignoring unreadable cache file {path}: {e}")
+            else:
+                if data.get('version') == self.VERSION:
+                    self.entries = data.get('entries', {})
+
+    def _entry_ttl(self, key: str) -> float:
+        """
+        Spread expiry times between half and the full TTL, deterministically
+        per URL, so that entries checked in the same run do not all go stale
+        on the same day.
+        """
+        digest = hashlib.sha1(key.encode('utf-8')).digest()
+        return self.ttl * (0.5 + digest[0] / 510)
+
+    def get(self, url: str) -> Optional[dict]:
+        """Return the cache entry for a URL, or None."""
+        return self.entries.get(normalize_url(url))
+
+    def is_fresh(self, url: str, now: Optional[float] = None) -> bool:
+        """Whether the cached entry for a URL can be reused without a request."""
+        key = normalize_url(url)
+        entry = self.entries.get(key)
+        if entry is None:
+            return False
+        now = time.time() if now is None else now
+        return now - entry.get('checked', 0) < self._entry_ttl(key)
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        """Build If-None-Match / If-Modified-Since headers from a cached entry."""
+        entry = self.get(url) or {}
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def to_result(self, url: str, index: int) -> CheckResult:
+        """Build a result for a URL from its cache entry."""
+        entry = self.get(url) or {}
+        return CheckResult(index, url, final_url=entry.get('final_url'),
+                           status=entry.get('status'), etag=entry.get('etag'),
+                           last_modified=entry.get('last_modified'), cached=True)
+
+    def update(self, result: CheckResult) -> None:
+        """Record a result; errors and error statuses drop any stale entry instead."""
+        key = normalize_url(result.url)
+        if result.error or (result.status or 0) >= 400:
+            self.entries.pop(key, None)
+            return
+        now = time.time()
+        previous = self.entries.get(key)
+        stable_since = now
+        if previous and previous.get('status') == result.status \
+                and previous.get('final_url') == result.final_url:
+            stable_since = previous.get('stable_since', previous.get('checked', now))
+        self.entries[key] = {
+            'status': result.status,
+            'final_url': result.final_url,
+            'etag': result.etag,
+            'last_modified': result.last_modified,
+            'checked': now,
+            'stable_since': stable_since,
+        }
+
+    def priority(self, url: str) -> Tuple[int, float]:
+        """
+        Sort key to check the riskiest URLs first: new URLs and URLs that
+        failed last time (errors are never cached), then URLs that redirected
+        last time, then the rest from the most to the least recently changed.
+        """
+        entry = self.get(url)
+        if entry is None:
+            return (0, 0.0)
+        if entry.get('final_url'):
+            return (1, 0.0)
+        return (2, -entry.get('stable_since', entry.get('checked', 0)))
+
+    def save(self) -> None:
+        """Atomically write the cache back to disk."""
+        if not self.path:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(self.path.suffix + '.tmp')
+        data = {'version': self.VERSION, 'entries': self.entries}
+        tmp_path.write_text(json.dumps(data, indent=2, sort_keys=True), encoding='utf-8')
+        tmp_path.replace(self.path)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a Retry-After header, either a number of seconds or an HTTP date.
+
+    :returns: Seconds to wait (never negative), or None if absent or invalid
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+def _result_from_response(resp: httpx.Response, url: str, index: int,
+                          cached: Optional[dict]) -> CheckResult:
+    """Build a CheckResult from the final response of a request chain."""
+    final_url = str(resp.url)
+    result = CheckResult(index, url, final_url=final_url if final_url != url else None,
+                         status=resp.status_code, etag=resp.headers.get('etag'),
+                         last_modified=resp.headers.get('last-modified'),
+                         retry_after=parse_retry_after(resp.headers.get('retry-after')))
+    if resp.status_code == 304 and cached:
+        # Not modified, the cached verdict still stands
+        result.status = cached.get('status')
+        result.etag = result.etag or cached.get('etag')
+        result.last_modified = result.last_modified or cached.get('last_modified')
+        result.cached = True
+    return result
+
+
+REQUEST_TIMEOUT = 10.0
+
+
+class RequestTrace:
+    """
+    Collect connection-phase timings from httpcore trace events for all the
+    requests made to check one URL (HEAD, GET fallback and redirect hops).
+
+    httpcore resolves host names as part of opening the TCP connection, so
+    DNS time is included in `connect`. `ttfb` adds up, per request, the time
+    from sending the request headers to receiving the response headers.
+    """
+    PHASES = {'connection.connect_tcp': 'connect', 'connection.start_tls': 'tls'}
+
+    def __init__(self):
+        self.timings: Dict[str, float] = {'connect': 0.0, 'tls': 0.0, 'ttfb': 0.0}
+        self.requests = 0
+        self.redirects = 0
+        # Start times of events in progress, per task as hedged requests overlap
+        self._started: Dict[Tuple[str, int], float] = {}
+
+    async def __call__(self, event_name: str, info: dict) -> None:
+        now = time.perf_counter()
+        event, _, stage = event_name.rpartition('.')
+        key = (event, id(asyncio.current_task()))
+        if stage == 'started':
+            self._started[key] = now
+            if event.endswith('.send_request_headers'):
+                self.requests += 1
+            return
+        started = self._started.pop(key, None)
+        if event in self.PHASES and started is not None:
+            self.timings[self.PHASES[event]] += now - started
+        elif event.endswith('.send_request_headers') and started is not None:
+            # Time to first byte counts from the start of the request
+            self._started[(event, key[1])] = started
+        elif event.endswith('.receive_response_headers') and stage == 'complete':
+            sent = self._started.pop((event.replace('receive_response', 'send_request'), key[1]), started)
+            if sent is not None:
+                self.timings['ttfb'] += now - sent
+            if 300 <= info['return_value'][1] < 400:
+                self.redirects += 1
+
+    def result(self, queue_wait: float, total: float, retries: int = 0) -> Dict[str, float]:
+        """All the timings of a URL check, in seconds (plus counts)."""
+        return dict(self.timings, queue_wait=queue_wait, total=total,
+                    requests=self.requests, redirects=self.redirects, retries=retries)
+
+
+# Trace of the URL check running in the current task, if timings are wanted
+_current_trace: contextvars.ContextVar[Optional[RequestTrace]] = \
+    contextvars.ContextVar('current_trace', default=None)
+
+
+def _trace_extensions() -> Optional[dict]:
+    """httpx request extensions enabling the current trace, if any."""
+    trace = _current_trace.get()
+    return {'trace': trace} if trace is not None else None
+
+
+def status_error(status: Optional[int]) -> Optional[str]:
+    """Describe an HTTP error status (4xx/5xx), or None for any other status."""
+    if status is None or status < 400:
+        return None
+    try:
+        return f"HTTP {status} {HTTPStatus(status).phrase}"
+    except ValueError:
+        return f"HTTP {status}"
 
 
-async def check_redirect(client: httpx.AsyncClient, url: str, index: int) -> Tuple[int, str, Optional[str], Optional[str]]:
+def _unreachable_origin(url: str, error: Optional[BaseException]) -> Optional[str]:
     """
-    Perform an async HEAD request to check if URL redirects.
-    Returns tuple of (index, url, final_url or None, error or None).
+    The origin of a URL if the error is a connection-level failure (DNS, TCP
+    or TLS handshake) of a request to that exact origin, not to a redirect
+    target or to another port or scheme of the same host.
     """
+    if not isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout)):
+        return None
+    try:
+        failed_url = str(error.request.url)
+    except RuntimeError:
+        return None
+    origin = url_origin(url)
+    return origin if url_origin(failed_url) == origin else None
+
+
+def _error_result(index: int, url: str, error: BaseException) -> CheckResult:
+    """
+    Build an error result, flagging connection-level failures to the URL's
+    own origin, as every other URL on that origin would fail in the same way.
+    """
+    return CheckResult(index, url, error=str(error) or type(error).__name__,
+                       unreachable_origin=_unreachable_origin(url, error),
+                       timed_out=isinstance(error, httpx.TimeoutException))
+
+
+# HEAD responses that mean "use GET instead" rather than a real verdict
+HEAD_REJECTED_STATUSES = {403, 405, 501}
+# Statuses worth another try: throttling and transient gateway/server failures
+RETRY_STATUSES = {429, 502, 503, 504}
+
+
+class HeadRejected(Exception):
+    """
+    A server answered a HEAD request with an error status.
+
+    The verdict is then taken from a GET request instead, as some servers
+    reject HEAD or answer it differently.
+    """
+
+    def __init__(self, status: int, url: str):
+        super().__init__(f"HEAD {status} for {url}")
+        self.status = status
+
+
+def _is_head_rejection(error: Optional[BaseException], get_result: CheckResult) -> bool:
+    """
+    Whether a failed HEAD request, followed by a successful GET, means the
+    host does not support HEAD.
+    """
+    if (get_result.status or 0) >= 400:
+        return False
+    if isinstance(error, HeadRejected):
+        return error.status in HEAD_REJECTED_STATUSES
+    return isinstance(error, (httpx.RemoteProtocolError, httpx.ReadError))
+
+
+class NoHeadHosts:
+    """
+    Hosts learnt to reject HEAD requests, so that their URLs go straight to GET.
+
+    A host is added when a HEAD request to it is rejected (403/405/501 or a
+    dropped connection) but the GET fallback gets a non-error status. The set can be
+    persisted to a small JSON file between runs; entries expire after
+    `expiry_days` so that hosts are periodically given another chance.
+    """
+    VERSION = 1
+
+    def __init__(self, path: Optional[Path] = None, expiry_days: float = 30):
+        self.path = path
+        self.expiry = expiry_days * 24 * 3600
+        self.hosts: Dict[str, float] = {}
+        self.learnt: Set[str] = set()
+        if path and path.exists():
+            try:
+                data = json.loads(path.read_text(encoding='utf-8'))
+            except (OSError, ValueError) as e:
+                print(f"⚠️  Ignoring unreadable no-HEAD hosts file {path}: {e}")
+            else:
+                if data.get('version') == self.VERSION:
+                    now = time.time()
+                    self.hosts = {host: seen for host, seen in data.get('hosts', {}).items()
+                                  if now - seen < self.expiry}
+
+    def __contains__(self, host: str) -> bool:
+        return host in self.hosts
+
+    def add(self, host: str) -> None:
+        """Remember that a host rejects HEAD requests."""
+        if host not in self.hosts:
+            self.learnt.add(host)
+        self.hosts[host] = time.time()
+
+    def save(self) -> None:
+        """Atomically write the host list back to disk."""
+        if not self.path:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(self.path.suffix + '.tmp')
+        data = {'version': self.VERSION, 'hosts': self.hosts}
+        tmp_path.write_text(json.dumps(data, indent=2, sort_keys=True), encoding='utf-8')
+        tmp_path.replace(self.path)
+
+
+async def _head_request(client: httpx.AsyncClient, url: str, index: int,
+                        cached: Optional[dict], headers: Optional[Dict[str, str]]) -> CheckResult:
+    """
+    Check a URL with a HEAD request, raising on failure.
+
+    A throttled or transient error status (RETRY_STATUSES) is the verdict,
+    so that the retry policy decides when to ask again instead of a GET
+    hitting the same busy server straight away.
+    """
+    resp = await client.head(url, headers=headers, follow_redirects=True,
+                             extensions=_trace_extensions())
+    if resp.status_code >= 400 and resp.status_code not in RETRY_STATUSES:
+        raise HeadRejected(resp.status_code, str(resp.url))
+    return _result_from_response(resp, url, index, cached)
+
+
+async def _get_request(client: httpx.AsyncClient, url: str, index: int,
+                       cached: Optional[dict], headers: Optional[Dict[str, str]]) -> CheckResult:
+    """
+    Check a URL with a GET request, raising on failure.
+
+    The request is streamed so that the body of the final page is never
+    downloaded: the status line and headers are all we need, and leaving
+    the stream closes the connection.
+    """
+    async with client.stream('GET', url, headers=headers, follow_redirects=True,
+                             extensions=_trace_extensions()) as resp:
+        return _result_from_response(resp, url, index, cached)
+
+
+class HedgeDelay:
+    """
+    Adaptive delay before a hedged GET is sent alongside a slow HEAD.
+
+    Tracks the latency of successful HEAD requests and uses a high
+    percentile of the recent ones, so that only the slowest few percent of
+    requests get hedged.
+    """
+
+    def __init__(self, percentile: float = 0.95, initial: float = 2.0,
+                 minimum: float = 0.25, maximum: float = 5.0,
+                 window: int = 200, min_samples: int = 20):
+        self.percentile = percentile
+        self.initial = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.min_samples = min_samples
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        """Record the latency of a successful HEAD request."""
+        self._samples.append(seconds)
+
+    def delay(self) -> float:
+        """Current delay before hedging, in seconds."""
+        if len(self._samples) < self.min_samples:
+            return self.initial
+        ordered = sorted(self._samples)
+        value = ordered[min(len(ordered) - 1, int(len(ordered) * self.percentile))]
+        return min(self.maximum, max(self.minimum, value))
+
+
+async def _hedged_request(client: httpx.AsyncClient, url: str, index: int,
+                          cached: Optional[dict], headers: Optional[Dict[str, str]],
+                          hedge: HedgeDelay, no_head_hosts: Optional[NoHeadHosts],
+                          scheduler: Optional['HostScheduler'] = None) -> CheckResult:
+    """
+    Send a HEAD request and, if it has not answered after the hedge delay
+    (or fails before then), a streamed GET in parallel. The first successful
+    answer wins and the other request is cancelled.
+
+    The hedged GET takes an extra in-flight slot of the host from
+    `scheduler`, if the host has none free the HEAD is waited for instead.
+    """
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    host = url_host(url)
+    head_task = asyncio.create_task(_head_request(client, url, index, cached, headers))
+    tasks = {head_task}
+    hedged = False
+    try:
+        await asyncio.wait(tasks, timeout=hedge.delay())
+        if not head_task.done():
+            hedged = scheduler is None or scheduler.take_extra_slot(host)
+            if not hedged:
+                await asyncio.wait(tasks)
+        if head_task.done() and head_task.exception() is None:
+            hedge.record(loop.time() - started)
+            return head_task.result()
+        if head_task.done():
+            if _unreachable_origin(url, head_task.exception()):
+                return _error_result(index, url, head_task.exception())
+            tasks.discard(head_task)
+        tasks.add(asyncio.create_task(_get_request(client, url, index, cached, headers)))
+
+        error: Optional[BaseException] = head_task.exception() if head_task.done() else None
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task is head_task and _unreachable_origin(url, task.exception()):
+                    # The GET is connecting to the same dead origin
+                    return _error_result(index, url, task.exception())
+                if task.exception() is None:
+                    if task is head_task:
+                        hedge.record(loop.time() - started)
+                    elif no_head_hosts is not None and head_task.done() and not head_task.cancelled() \
+                            and _is_head_rejection(head_task.exception(), task.result()):
+                        no_head_hosts.add(host)
+                    return task.result()
+                error = task.exception()
+        return _error_result(index, url, error)
+    finally:
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        if hedged and scheduler is not None:
+            await scheduler.release_extra_slot(host)
+
+
+async def check_redirect(client: httpx.AsyncClient, url: str, index: int,
+                         cached: Optional[dict] = None,
+                         headers: Optional[Dict[str, str]] = None,
+                         hedge: Optional[HedgeDelay] = None,
+                         no_head_hosts: Optional[NoHeadHosts] = None,
+                         scheduler: Optional['HostScheduler'] = None) -> CheckResult:
+    """
+    Perform an async HEAD request to check if URL redirects, falling back
+    to a streamed GET request if HEAD fails (but not if the URL's origin
+    could not be connected to).
+
+    If a stale cache entry is given, its validators (passed as `headers`)
+    turn the request into a conditional one, and a 304 response reuses the
+    cached verdict. With `hedge`, a slow HEAD is raced against a GET instead
+    of waiting for it to time out, if the host has a free slot in
+    `scheduler`. Hosts in `no_head_hosts` skip the HEAD
+    request, and hosts found to reject HEAD are added to it.
+    """
+    host = url_host(url)
+    if no_head_hosts is not None and host in no_head_hosts:
+        try:
+            return await _get_request(client, url, index, cached, headers)
+        except Exception as e:
+            return _error_result(index, url, e)
+    if hedge is not None:
+        return await _hedged_request(client, url, index, cached, headers, hedge, no_head_hosts,
+                                     scheduler)
     try:
         # Try HEAD request first for speed
-        resp = await client.head(url, follow_redirects=True, timeout=10.0)
-        final_url = str(resp.url)
-        if final_url != url:
-            return (index, url, final_url, None)
-        return (index, url, None, None)
-    except (httpx.HTTPError, httpx.TimeoutException):
+        return await _head_request(client, url, index, cached, headers)
+    except (httpx.HTTPError, httpx.TimeoutException, HeadRejected) as head_error:
+        if _unreachable_origin(url, head_error):
+            # A GET would only wait for the same connection to fail again
+            return _error_result(index, url, head_error)
         # Try GET request if HEAD fails
         try:
-            resp = await client.get(url, follow_redirects=True, timeout=10.0)
-            final_url = str(resp.url)
-            if final_url != url:
-                return (index, url, final_url, None)
-            return (index, url, None, None)
+            result = await _get_request(client, url, index, cached, headers)
         except Exception as e:
-            return (index, url, None, str(e))
+            return _error_result(index, url, e)
+        if no_head_hosts is not None and _is_head_rejection(head_error, result):
+            no_head_hosts.add(host)
+        return result
+
+
+DEFAULT_RETRIES = 2
+DEFAULT_RETRY_BUDGET = 10
+
+
+class RetryPolicy:
+    """
+    Decide whether, and after how long, a URL answered with a transient
+    error status (see RETRY_STATUSES) is checked again.
+
+    The delay is the server's Retry-After when given, otherwise an
+    exponential backoff from `base_delay` (capped at `max_delay`) with half
+    of it jittered so that retries to the same host spread out. A URL is
+    retried at most `retries` times and every host has a budget of
+    `host_budget` retries shared by all its URLs, so a host that keeps
+    failing cannot stall the run. A Retry-After longer than
+    `max_retry_after` is not waited for and the error stands.
+    """
+
+    def __init__(self, retries: int = DEFAULT_RETRIES, host_budget: int = DEFAULT_RETRY_BUDGET,
+                 base_delay: float = 1.0, max_delay: float = 30.0, max_retry_after: float = 120.0):
+        self.retries = retries
+        self.host_budget = host_budget
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        self.spent: Dict[str, int] = {}
+
+    def delay(self, result: CheckResult, attempt: int) -> Optional[float]:
+        """
+        Consume a retry for the result's host if the result is worth retrying.
 
+        :param attempt: Number of retries of this URL so far
+        :returns: Seconds to wait before retrying, or None to keep the result
+        """
+        host = url_host(result.url)
+        if (result.status not in RETRY_STATUSES or attempt >= self.retries
+                or self.spent.get(host, 0) >= self.host_budget):
+            return None
+        if result.retry_after is not None:
+            if result.retry_after > self.max_retry_after:
+                return None
+            delay = result.retry_after
+        else:
+            backoff = min(self.max_delay, self.base_delay * 2 ** attempt)
+            delay = backoff / 2 + random.uniform(0, backoff / 2)
+        self.spent[host] = self.spent.get(host, 0) + 1
+        return delay
 
-async def check_all_redirects(urls: List[str]) -> List[Tuple[int, str, Optional[str], Optional[str]]]:
-    """Check all URLs for redirects asynchronously."""
-    async with httpx.AsyncClient() as client:
-        tasks = [check_redirect(client, url, i) for i, url in enumerate(urls, 1)]
-        results = await asyncio.gather(*tasks)
-        return results
+
+DEFAULT_MAX_CONNECTIONS = 32
+DEFAULT_MAX_PER_HOST = 4
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+
+def url_host(url: str) -> str:
+    """Return the lowercase host name of a URL, or an empty string."""
+    return (urlsplit(url).hostname or '').lower()
+
+
+def url_origin(url: str) -> str:
+    """
+    Return the origin of a URL, its lowercase scheme, host and port (only
+    when not the scheme's default), e.g. ``https://example.com:8443``.
+    """
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    origin = f"{scheme}://{(parts.hostname or '').lower()}"
+    if parts.port and (scheme, parts.port) not in (('http', 80), ('https', 443)):
+        origin += f":{parts.port}"
+    return origin
+
+
+def shard_of(host: str, shard_count: int) -> int:
+    """
+    Stable 1-based shard number of a host, so that every URL of a host is
+    checked by the same shard and per-host limits still hold.
+    """
+    digest = hashlib.sha1(host.encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % shard_count + 1
+
+
+RESULTS_VERSION = 1
+
+
+def save_results(path: Path, results: List[CheckResult], url_index: UrlIndex) -> None:
+    """Write results and where their URLs appear to a JSON file for --merge."""
+    entries = []
+    for result in sorted(results, key=lambda r: r.index):
+        entry = asdict(result)
+        entry['occurrences'] = [list(o) for o in url_index.get(result.url, [])]
+        entries.append(entry)
+    data = {'version': RESULTS_VERSION, 'results': entries}
+    path.write_text(json.dumps(data, indent=2), encoding='utf-8')
+
+
+def load_results(paths: List[Path]) -> Tuple[List[CheckResult], UrlIndex]:
+    """Load and combine results files written by save_results()."""
+    results: List[CheckResult] = []
+    url_index: UrlIndex = {}
+    for path in paths:
+        data = json.loads(path.read_text(encoding='utf-8'))
+        if data.get('version') != RESULTS_VERSION:
+            raise ValueError(f"Unsupported results file version in {path}")
+        for entry in data['results']:
+            occurrences = [UrlOccurrence(*o) for o in entry.pop('occurrences', [])]
+            result = CheckResult(**entry)
+            if result.url in url_index:
+                continue
+            url_index[result.url] = occurrences
+            results.append(result)
+    return results, url_index
+
+
+class Checkpoint:
+    """
+    Append-only JSON Lines file with every result as soon as it is known.
+
+    If a run is cancelled or times out, a new run with `resume` reuses the
+    results already in the file (matched by URL) and only checks the rest.
+    Without `resume` the file is started afresh.
+    """
+
+    def __init__(self, path: Path, resume: bool = False):
+        self.path = path
+        self.settled: Dict[str, dict] = {}
+        if resume and path.exists():
+            for line in path.read_text(encoding='utf-8').splitlines():
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A line cut short when the previous run was interrupted
+                    continue
+                if isinstance(entry, dict) and 'url' in entry:
+                    self.settled[entry['url']] = entry
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(path, 'a' if resume else 'w', encoding='utf-8')
+
+    def __contains__(self, url: str) -> bool:
+        return url in self.settled
+
+    def to_result(self, url: str, index: int) -> CheckResult:
+        """Build a result for a URL settled in a previous run."""
+        return CheckResult(**dict(self.settled[url], index=index))
+
+    def record(self, result: CheckResult) -> None:
+        """Append a result and flush it to disk straight away."""
+        self._file.write(json.dumps(asdict(result)) + '\n')
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class HostScheduler:
+    """
+    Run async jobs with a global in-flight cap and a per-host in-flight cap.
+
+    Pending jobs are queued per host and the hosts are served round-robin,
+    so a host with hundreds of URLs (e.g. github.com) is interleaved with the
+    rest instead of receiving a single burst of requests. A host can be held
+    back for a while (see defer()) without holding up the other hosts.
+    """
+
+    def __init__(self, max_in_flight: int = DEFAULT_MAX_CONNECTIONS,
+                 max_per_host: int = DEFAULT_MAX_PER_HOST):
+        if max_in_flight < 1 or max_per_host < 1:
+            raise ValueError("Concurrency limits must be at least 1")
+        self.max_in_flight = max_in_flight
+        self.max_per_host = max_per_host
+        self._pending: Dict[str, Deque] = {}
+        self._hosts: Deque[str] = deque()
+        self._in_flight: Dict[str, int] = {}
+        self._total_in_flight = 0
+        # Monotonic time before which a deferred host is not served
+        self._ready_at: Dict[str, float] = {}
+        self._cond: Optional[asyncio.Condition] = None
+
+    def add(self, host: str, job) -> None:
+        """Queue a job for the given host."""
+        if host not in self._pending:
+            self._pending[host] = deque()
+            self._in_flight[host] = 0
+            self._hosts.append(host)
+        self._pending[host].append(job)
+
+    def defer(self, host: str, job, delay: float) -> None:
+        """
+        Queue a job again at the front of its host's queue, and do not start
+        any job of that host for `delay` seconds.
+        """
+        self.add(host, job)
+        self._pending[host].rotate(1)
+        ready_at = time.monotonic() + delay
+        self._ready_at[host] = max(self._ready_at.get(host, 0.0), ready_at)
+
+    def drain(self, host: str, match: Optional[Callable[[object], bool]] = None) -> List:
+        """Remove and return the jobs still pending for a host (only those matching `match`)."""
+        pending = self._pending.get(host)
+        if not pending:
+            return []
+        jobs, kept = [], deque()
+        for job in pending:
+            (jobs if match is None or match(job) else kept).append(job)
+        self._pending[host] = kept
+        return jobs
+
+    def take_extra_slot(self, host: str) -> bool:
+        """
+        Take one more in-flight slot for a job already running on a host
+        (e.g. for a hedged request), if the host and global caps allow it.
+        """
+        if self._in_flight.get(host, 0) >= self.max_per_host or self._total_in_flight >= self.max_in_flight:
+            return False
+        self._in_flight[host] = self._in_flight.get(host, 0) + 1
+        self._total_in_flight += 1
+        return True
+
+    async def release_extra_slot(self, host: str) -> None:
+        """Give back a slot taken with take_extra_slot()."""
+        async with self._cond:
+            self._in_flight[host] -= 1
+            self._total_in_flight -= 1
+            self._cond.notify_all()
+
+    def _has_pending(self) -> bool:
+        return any(self._pending.values())
+
+    def _next_job(self) -> Optional[Tuple[str, object]]:
+        """Pick the next job from the next ready host (round-robin) with spare capacity."""
+        now = time.monotonic()
+        for _ in range(len(self._hosts)):
+            host = self._hosts[0]
+            self._hosts.rotate(-1)
+            if (self._pending[host] and self._in_flight[host] < self.max_per_host
+                    and self._ready_at.get(host, 0.0) <= now):
+                return host, self._pending[host].popleft()
+        return None
+
+    def _next_ready_in(self) -> Optional[float]:
+        """Seconds until a deferred host with pending jobs is ready, if any."""
+        now = time.monotonic()
+        waits = [ready_at - now for host, ready_at in self._ready_at.items() if self._pending[host]]
+        return max(0.0, min(waits)) if waits else None
+
+    async def _worker(self, run_job: Callable[[T], Awaitable[R]], results: asyncio.Queue) -> None:
+        while True:
+            async with self._cond:
+                while True:
+                    picked = self._next_job()
+                    if picked is not None:
+                        break
+                    if not self._has_pending() and self._total_in_flight == 0:
+                        return
+                    # Wake up for a finished job, or when a deferred host is ready
+                    try:
+                        async with asyncio.timeout(self._next_ready_in()):
+                            await self._cond.wait()
+                    except TimeoutError:
+                        pass
+                host, job = picked
+                self._in_flight[host] += 1
+                self._total_in_flight += 1
+            try:
+                result = await run_job(job)
+                if result is not None:
+                    results.put_nowait(result)
+            finally:
+                async with self._cond:
+                    self._in_flight[host] -= 1
+                    self._total_in_flight -= 1
+                    self._cond.notify_all()
+
+    async def run(self, run_job: Callable[[T], Awaitable[R]]) -> AsyncIterator[R]:
+        """
+        Run all queued jobs, yielding their results as they complete.
+
+        `run_job` returns None for a job it has deferred to be run again.
+        """
+        self._cond = asyncio.Condition()
+        results: asyncio.Queue = asyncio.Queue()
+        finished = object()
+
+        async def run_workers() -> None:
+            try:
+                await asyncio.gather(*(self._worker(run_job, results)
+                                       for _ in range(self.max_in_flight)))
+            finally:
+                results.put_nowait(finished)
+
+        runner = asyncio.create_task(run_workers())
+        try:
+            while (result := await results.get()) is not finished:
+                yield result
+            # Re-raise any exception from the workers
+            await runner
+        finally:
+            if not runner.done():
+                runner.cancel()
+                await asyncio.gather(runner, return_exceptions=True)
+
+
+class HostChecker(ABC):
+    """
+    Base class for host-specific checkers.
+
+    A host checker claims the URLs it knows how to verify more cheaply than
+    with one HTTP request each (e.g. through a batch API) and checks them
+    all at once. URLs it cannot settle are handed back and go through the
+    normal HTTP checks.
+    """
+
+    name = 'host'
+
+    @abstractmethod
+    def claims(self, url: str) -> bool:
+        """Whether this checker wants to check the given URL."""
+
+    @abstractmethod
+    async def check(self, client: httpx.AsyncClient,
+                    jobs: List[Tuple[int, str]]) -> Tuple[List[CheckResult], List[Tuple[int, str]]]:
+        """
+        Check the claimed (index, url) jobs.
+
+        :returns: Tuple of (results, jobs left for the normal HTTP checks)
+        """
+
+
+class GitHubRepoChecker(HostChecker):
+    """
+    Check ``https://github.com/<owner>/<repo>`` links in batches through the
+    GitHub GraphQL API.
+
+    The API resolves renamed and transferred repositories to their current
+    owner and name, which is reported as a redirect, and returns nothing for
+    deleted or private ones, which is reported as an error. The GraphQL API
+    needs a token, without one the links are checked over HTTP as usual.
+    Set ``GITHUB_GRAPHQL_URL`` to point the checker at another server, the
+    tests use a stand-in answering through an ``httpx.MockTransport``.
+    """
+
+    name = 'GitHub'
+    BATCH_SIZE = 50
+    REPO_URL_PATTERN = re.compile(
+        r'^https?://(?:www\.)?github\.com/([A-Za-z0-9-]+)/([A-Za-z0-9._-]+?)(?:\.git)?/?(#.*)?$'
+    )
+    # First path segments that are GitHub pages rather than users or orgs
+    RESERVED_OWNERS = {
+        'about', 'apps', 'collections', 'enterprise', 'events', 'explore', 'features',
+        'login', 'marketplace', 'new', 'notifications', 'orgs', 'organizations',
+        'pricing', 'settings', 'site', 'sponsors', 'topics', 'trending', 'users',
+    }
+
+    def __init__(self, token: str, api_url: Optional[str] = None):
+        self.token = token
+        self.api_url = api_url or os.getenv('GITHUB_GRAPHQL_URL', 'https://api.github.com/graphql')
+
+    def _repo(self, url: str) -> Optional[Tuple[str, str, str]]:
+        """Return (owner, name, fragment) for a repository URL, or None."""
+        match = self.REPO_URL_PATTERN.match(url)
+        if not match or match.group(1).lower() in self.RESERVED_OWNERS:
+            return None
+        owner, name, fragment = match.groups()
+        if name in ('.', '..'):
+            return None
+        return owner, name, fragment or ''
+
+    def claims(self, url: str) -> bool:
+        return bool(self.token) and self._repo(url) is not None
+
+    async def _query_batch(self, client: httpx.AsyncClient,
+                           repos: List[Tuple[str, str]]) -> Dict[str, Optional[dict]]:
+        """Look up a batch of (owner, name) pairs, returns alias -> repository."""
+        params = ', '.join(f'$o{i}: String!, $n{i}: String!' for i in range(len(repos)))
+        fields = ' '.join(f'r{i}: repository(owner: $o{i}, name: $n{i}) {{ nameWithOwner url }}'
+                          for i in range(len(repos)))
+        variables = {}
+        for i, (owner, name) in enumerate(repos):
+            variables[f'o{i}'] = owner
+            variables[f'n{i}'] = name
+        resp = await client.post(
+            self.api_url,
+            json={'query': f'query({params}) {{ {fields} }}', 'variables': variables},
+            headers={'Authorization': f'bearer {self.token}'},
+            timeout=30.0,
+        )
+        resp.raise_for_status()
+        payload = resp.json()
+        data = payload.get('data')
+        if data is None:
+            raise ValueError(f"GitHub GraphQL error: {payload.get('errors')}")
+        # Aliases that errored with anything other than NOT_FOUND are unknown
+        for error in payload.get('errors') or []:
+            if error.get('type') != 'NOT_FOUND':
+                for alias in error.get('path') or []:
+                    data.pop(alias, None)
+        return data
+
+    async def _check_batch(self, client: httpx.AsyncClient,
+                           jobs: List[Tuple[int, str]]) -> Tuple[List[CheckResult], List[Tuple[int, str]]]:
+        repos = [self._repo(url) for _, url in jobs]
+        try:
+            data = await self._query_batch(client, [(owner, name) for owner, name, _ in repos])
+        except (httpx.HTTPError, ValueError) as e:
+            print(f"⚠️  {self.name} batch check failed, falling back to HTTP: {e}")
+            return [], jobs
+
+        results, leftover = [], []
+        for i, ((index, url), (owner, name, fragment)) in enumerate(zip(jobs, repos)):
+            alias = f'r{i}'
+            if alias not in data:
+                leftover.append((index, url))
+            elif data[alias] is None:
+                results.append(CheckResult(index, url, status=404,
+                                           error=f"GitHub repository {owner}/{name} not found"))
+            elif data[alias]['nameWithOwner'].lower() != f'{owner}/{name}'.lower() \
+                    or not url.startswith('https://github.com/'):
+                results.append(CheckResult(index, url, status=200,
+                                           final_url=data[alias]['url'] + fragment))
+            else:
+                results.append(CheckResult(index, url, status=200))
+        return results, leftover
+
+    async def check(self, client: httpx.AsyncClient,
+                    jobs: List[Tuple[int, str]]) -> Tuple[List[CheckResult], List[Tuple[int, str]]]:
+        batches = [jobs[i:i + self.BATCH_SIZE] for i in range(0, len(jobs), self.BATCH_SIZE)]
+        results, leftover = [], []
+        for batch_results, batch_leftover in await asyncio.gather(
+                *(self._check_batch(client, batch) for batch in batches)):
+            results.extend(batch_results)
+            leftover.extend(batch_leftover)
+        return results, leftover
+
+
+async def check_all_redirects(urls: List[str],
+                              max_connections: int = DEFAULT_MAX_CONNECTIONS,
+                              max_per_host: int = DEFAULT_MAX_PER_HOST,
+                              cache: Optional[LinkCache] = None,
+                              hedge: bool = False,
+                              no_head_hosts: Optional[NoHeadHosts] = None,
+                              host_checkers: Sequence[HostChecker] = (),
+                              timeout: float = REQUEST_TIMEOUT,
+                              shard: Optional[Tuple[int, int]] = None,
+                              checkpoint: Optional[Checkpoint] = None,
+                              on_result: Optional[Callable[[CheckResult], None]] = None,
+                              time_budget: Optional[float] = None,
+                              retry: Optional[RetryPolicy] = None) -> List[CheckResult]:
+    """
+    Check all URLs for redirects asynchronously.
+
+    :param max_connections: Maximum number of requests in flight at any time
+    :param max_per_host: Maximum number of those requests to the same host
+    :param cache: URLs with a fresh entry are not requested at all, stale
+        entries are revalidated, and the cache is updated with the results
+    :param hedge: Race slow HEAD requests against a GET request after an
+        adaptive delay
+    :param no_head_hosts: Hosts that reject HEAD requests, their URLs are
+        checked with GET directly, and new ones are learnt into it
+    :param host_checkers: URLs claimed by one of them are checked by it in
+        bulk, anything it cannot settle falls back to the normal checks
+    :param timeout: Seconds before each request times out
+    :param shard: As (i, N), only check the URLs whose host falls in shard i
+        of N, keeping their index in the full list
+    :param checkpoint: Results are appended to it as they finish, and URLs
+        already settled in it are not checked again
+    :param on_result: Called with every result as soon as it is known
+    :param time_budget: Seconds after which the URLs still unchecked are
+        returned as not checked, the riskiest URLs according to the cache
+        history are checked first
+    :param retry: Decides which URLs answered with a transient error are
+        checked again, holding back only their host in the meantime
+
+    When an origin (scheme, host and port) cannot be connected to, its URLs
+    still pending are failed straight away with the same error.
+    """
+    results: List[CheckResult] = []
+    unsettled: Dict[int, str] = {}
+    # Number of retries and latest result of URLs waiting to be retried
+    attempts: Dict[int, int] = {}
+    retrying: Dict[int, CheckResult] = {}
+
+    def settle(result: CheckResult, checked: bool = True) -> None:
+        """Collect a result as soon as it is known."""
+        unsettled.pop(result.index, None)
+        results.append(result)
+        if checked:
+            if checkpoint:
+                checkpoint.record(result)
+            if cache:
+                cache.update(result)
+        if on_result:
+            on_result(result)
+
+    scheduler = HostScheduler(max_connections, max_per_host)
+    hedge_delay = HedgeDelay() if hedge else None
+    claimed: Dict[HostChecker, List[Tuple[int, str]]] = {checker: [] for checker in host_checkers}
+    unclaimed: List[Tuple[int, str]] = []
+    now = time.time()
+    for i, url in enumerate(urls, 1):
+        if shard and shard_of(url_host(url), shard[1]) != shard[0]:
+            continue
+        if checkpoint and url in checkpoint:
+            settle(checkpoint.to_result(url, i), checked=False)
+            continue
+        if cache and cache.is_fresh(url, now):
+            settle(cache.to_result(url, i), checked=False)
+            continue
+        unsettled[i] = url
+        checker = next((c for c in host_checkers if c.claims(url)), None)
+        if checker is not None:
+            claimed[checker].append((i, url))
+        else:
+            unclaimed.append((i, url))
+
+    async def run_job(job: Tuple[int, str]) -> Optional[CheckResult]:
+        index, url = job
+        cached = cache.get(url) if cache else None
+        headers = cache.conditional_headers(url) if cache else None
+        trace = RequestTrace()
+        _current_trace.set(trace)
+        started = time.perf_counter()
+        result = await check_redirect(client, url, index, cached, headers, hedge_delay, no_head_hosts,
+                                      scheduler)
+        result.timings = trace.result(started - run_started, time.perf_counter() - started,
+                                      attempts.get(index, 0))
+        delay = retry.delay(result, attempts.get(index, 0)) if retry else None
+        if delay is not None:
+            print(f"🔁 Retrying {url} in {delay:.1f}s ({status_error(result.status)})")
+            attempts[index] = attempts.get(index, 0) + 1
+            retrying[index] = result
+            scheduler.defer(url_host(url), job, delay)
+            return None
+        retrying.pop(index, None)
+        if result.unreachable_origin:
+            def same_origin(other_job: Tuple[int, str]) -> bool:
+                return url_origin(other_job[1]) == result.unreachable_origin
+
+            for other_index, other_url in scheduler.drain(url_host(url), same_origin):
+                settle(replace(result, index=other_index, url=other_url, timings=None))
+        return result
+
+    limits = httpx.Limits(max_connections=max_connections,
+                          max_keepalive_connections=max_connections)
+    async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+        try:
+            async with asyncio.timeout(time_budget):
+                for checker, jobs in claimed.items():
+                    if jobs:
+                        checker_results, leftover = await checker.check(client, jobs)
+                        print(f"{checker.name} checker settled {len(checker_results)} of {len(jobs)} URL(s)")
+                        for result in checker_results:
+                            settle(result)
+                        unclaimed.extend(leftover)
+                if cache:
+                    unclaimed.sort(key=lambda job: (cache.priority(job[1]), job[0]))
+                else:
+                    unclaimed.sort()
+                for index, url in unclaimed:
+                    scheduler.add(url_host(url), (index, url))
+                run_started = time.perf_counter()
+                async for result in scheduler.run(run_job):
+                    settle(result)
+        except TimeoutError:
+            not_checked = sum(1 for index in unsettled if index not in retrying)
+            # The budget may be what main() had left, not the one configured
+            print(f"⏳ Time budget exhausted, {not_checked} URL(s) not checked")
+            for index, url in sorted(unsettled.items()):
+                if index in retrying:
+                    # The error that was going to be retried stands
+                    settle(retrying[index])
+                else:
+                    settle(CheckResult(index, url, not_checked=True), checked=False)
+
+    if cache:
+        cache.save()
+    if no_head_hosts is not None:
+        no_head_hosts.save()
+    return results
 
 
 def parse_cli_args():
     parser = argparse.ArgumentParser(
-        description='Check for redirects in all URLs found in a Markdown file.'
+        description='Check for redirects in all URLs found in Markdown files.'
     )
     parser.add_argument(
-        'markdown_file',
-        nargs='?',
-        default='README.md',
-        help='Path to the Markdown file to scan (default: README.md)'
+        'markdown_files',
+        nargs='*',
+        metavar='markdown_file',
+        default=['README.md'],
+        help='Paths or globs (e.g. docs/**/*.md) of the Markdown files to scan, '
+             'URLs found in several files are checked once (default: README.md)'
     )
     parser.add_argument(
         '--fail-on-redirect',
         action='store_true',
         help='Fail if redirects are found (default: only fail on errors)'
     )
-    return parser.parse_args()
+    parser.add_argument(
+        '--max-connections',
+        type=int,
+        default=DEFAULT_MAX_CONNECTIONS,
+        help=f'Maximum number of requests in flight (default: {DEFAULT_MAX_CONNECTIONS})'
+    )
+    parser.add_argument(
+        '--max-per-host',
+        type=int,
+        default=DEFAULT_MAX_PER_HOST,
+        help=f'Maximum number of requests in flight per host (default: {DEFAULT_MAX_PER_HOST})'
+    )
+    parser.add_argument(
+        '--cache',
+        type=Path,
+        default=None,
+        help='JSON file used to cache results between runs (default: no cache)'
+    )
+    parser.add_argument(
+        '--cache-ttl',
+        type=float,
+        default=DEFAULT_CACHE_TTL_HOURS,
+        help='Hours before a cached result is revalidated '
+             f'(default: {DEFAULT_CACHE_TTL_HOURS})'
+    )
+    parser.add_argument(
+        '--hedge',
+        action='store_true',
+        help='Send a GET request alongside HEAD requests that are slower than '
+             'usual and use whichever answers first'
+    )
+    parser.add_argument(
+        '--no-head-hosts',
+        type=Path,
+        default=None,
+        help='JSON file to remember hosts that reject HEAD requests between runs'
+    )
+    parser.add_argument(
+        '--github-token',
+        default=os.getenv('GITHUB_TOKEN', ''),
+        help='Token to check GitHub repository links in batches through the '
+             'GraphQL API (default: $GITHUB_TOKEN, checked over HTTP if unset)'
+    )
+    parser.add_argument(
+        '--diff',
+        metavar='BASE..HEAD',
+        default=None,
+        help='Only check URLs in lines added or modified in this git revision range'
+    )
+    parser.add_argument(
+        '--check-status',
+        action='store_true',
+        help='Report URLs whose final response has an error status (4xx/5xx) as errors'
+    )
+    parser.add_argument(
+        '--allow-status',
+        type=lambda value: {int(code) for code in value.split(',') if code.strip()},
+        default=set(),
+        metavar='CODES',
+        help='Comma separated status codes that are not reported as errors, e.g. 429'
+    )
+    parser.add_argument(
+        '--allow-list',
+        type=Path,
+        default=None,
+        help='File with comma or newline separated domains/URLs whose errors are ignored'
+    )
+    parser.add_argument(
+        '--timeout',
+        type=float,
+        default=REQUEST_TIMEOUT,
+        help=f'Seconds before a request times out (default: {REQUEST_TIMEOUT})'
+    )
+    parser.add_argument(
+        '--allow-timeout',
+        action='store_true',
+        help='Do not report requests that time out as errors'
+    )
+    parser.add_argument(
+        '--time-budget',
+        type=float,
+        default=None,
+        metavar='SECONDS',
+        help='Stop checking after this many seconds and report the rest as not checked; '
+             'new, failing and redirecting URLs (per --cache) are checked first'
+    )
+    parser.add_argument(
+        '--checkpoint',
+        type=Path,
+        default=None,
+        help='Append every result to this JSON Lines file as soon as it is known'
+    )
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='Reuse the results already in the --checkpoint file and only check the rest'
+    )
+    parser.add_argument(
+        '--shard',
+        metavar='I/N',
+        default=None,
+        help='Only check the URLs of hosts in shard I of N (1-based), e.g. 2/4'
+    )
+    parser.add_argument(
+        '--results',
+        type=Path,
+        default=None,
+        help='Write the raw results to this JSON file, to combine them with --merge'
+    )
+    parser.add_argument(
+        '--merge',
+        type=Path,
+        nargs='+',
+        metavar='RESULTS',
+        default=None,
+        help='Do not check anything, report the combined results of these --results files'
+    )
+    parser.add_argument(
+        '--retries',
+        type=int,
+        default=DEFAULT_RETRIES,
+        help='Times to retry a URL answered with HTTP 429, 502, 503 or 504, after its '
+             f'Retry-After or an exponential backoff (default: {DEFAULT_RETRIES}, 0 to disable)'
+    )
+    parser.add_argument(
+        '--retry-budget',
+        type=int,
+        default=DEFAULT_RETRY_BUDGET,
+        help=f'Maximum number of retries per host (default: {DEFAULT_RETRY_BUDGET})'
+    )
+    parser.add_argument(
+        '--timings',
+        type=Path,
+        default=None,
+        help='Write the per-URL request timings to this JSON file'
+    )
+    args = parser.parse_args()
+    if args.max_connections < 1 or args.max_per_host < 1:
+        parser.error('--max-connections and --max-per-host must be at least 1')
+    if args.retries < 0 or args.retry_budget < 0:
+        parser.error('--retries and --retry-budget cannot be negative')
+    if args.resume and not args.checkpoint:
+        parser.error('--resume needs --checkpoint')
+    if args.shard:
+        match = re.fullmatch(r'(\d+)/(\d+)', args.shard)
+        if not match or not 1 <= int(match.group(1)) <= int(match.group(2)):
+            parser.error('--shard must be I/N with 1 <= I <= N')
+        args.shard = (int(match.group(1)), int(match.group(2)))
+    return args
 
 
-def main():
-    print_title = lambda msg: print(f"\n{'='*80}\n{msg}\n{'='*80}")
-    gh_summary_file = os.getenv('GITHUB_STEP_SUMMARY')
+class Verdict(NamedTuple):
+    """How a checked URL is reported."""
+    # The error, or with --check-status an error status, if any
+    error: Optional[str]
+    # The error is in the exception or allow list, or has an allowed status
+    error_ignored: bool
+    # The redirect, if any, is in the exception list
+    redirect_ignored: bool
 
-    args = parse_cli_args()
-    markdown_file = args.markdown_file
-    fail_on_redirect = args.fail_on_redirect
 
-    print_title(f"🔍 Extracting URLs from {markdown_file}...")
-    try:
-        text = Path(markdown_file).read_text(encoding='utf-8')
-        urls = extract_urls_from_markdown(text)
-    except Exception as e:
-        print(f"❌ Error reading file: {e}")
-        sys.exit(1)
-    print(f"Found {len(urls)} unique URLs")
-    if not urls:
-        print("No URLs found in the file.")
-        sys.exit(0)
+class ResultPolicy:
+    """
+    Classify check results with the ignore lists, the allow list and the
+    status policies from the command line, so that the live progress and
+    the final report agree on what is a problem.
+    """
 
-    print_title("🔗 Checking for redirects...")
-    results = asyncio.run(check_all_redirects(urls))
-    results.sort(key=lambda x: x[0])
+    def __init__(self, allow_list: Optional[IgnoreMatcher] = None, check_status: bool = False,
+                 allow_status: Set[int] = frozenset(), allow_timeout: bool = False):
+        self.allow_list = allow_list or IgnoreMatcher()
+        self.check_status = check_status
+        self.allow_status = allow_status
+        self.allow_timeout = allow_timeout
+
+    @classmethod
+    def from_args(cls, args) -> 'ResultPolicy':
+        """Build the policy from the parsed command line arguments."""
+        allow_list = IgnoreMatcher(load_allow_list(args.allow_list)) if args.allow_list else None
+        return cls(allow_list, args.check_status, args.allow_status, args.allow_timeout)
+
+    def classify(self, result: CheckResult) -> Verdict:
+        """Find the error of a result and whether it or its redirect is ignored."""
+        error = result.error
+        if not error and self.check_status:
+            error = status_error(result.status)
+        error_ignored = bool(error) and (
+            should_ignore_error(result.url) or self.allow_list.matches(result.url)
+            or result.status in self.allow_status
+            or (result.timed_out and self.allow_timeout))
+        redirect_ignored = bool(result.final_url) and should_ignore_redirect(result.url)
+        return Verdict(error, error_ignored, redirect_ignored)
+
+
+class Progress:
+    """
+    Live progress of a check run: prints failures and redirects as soon as
+    they are known, plus a periodic count with an ETA. The final report is
+    built separately, from all the results once the run is over.
+    """
+
+    def __init__(self, total: int, policy: Optional[ResultPolicy] = None, interval: float = 10.0):
+        self.total = total
+        self.policy = policy or ResultPolicy()
+        self.interval = interval
+        self.done = 0
+        self.problems = 0
+        self._started = time.monotonic()
+        self._last_report = self._started
+        self._next_percent = 10
+
+    def _eta(self, now: float) -> str:
+        done = self.done
+        if not done or done >= self.total:
+            return "0s"
+        remaining = (now - self._started) / done * (self.total - done)
+        return f"{remaining:.0f}s"
+
+    def __call__(self, result: CheckResult) -> None:
+        self.done += 1
+        if result.not_checked:
+            return
+        verdict = self.policy.classify(result)
+        done = self.done
+        prefix = f"[{done}/{self.total}]"
+        if verdict.error and not verdict.error_ignored:
+            self.problems += 1
+            print(f"{prefix} ❌ {result.url}: {verdict.error}", flush=True)
+        elif result.final_url and not verdict.redirect_ignored:
+            self.problems += 1
+            print(f"{prefix} ↪️  {result.url} → {result.final_url}", flush=True)
+
+        now = time.monotonic()
+        percent = done * 100 // self.total if self.total else 100
+        if percent >= self._next_percent or now - self._last_report >= self.interval \
+                or done == self.total:
+            self._next_percent = percent // 10 * 10 + 10
+            self._last_report = now
+            print(f"{prefix} {percent}% checked, {self.problems} problem(s), "
+                  f"{now - self._started:.0f}s elapsed, ETA {self._eta(now)}", flush=True)
+
+
+def print_title(msg: str) -> None:
+    print(f"\n{'='*80}\n{msg}\n{'='*80}")
+
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.25, 0.5, 1, 2, 5, 10)
+SLOWEST_HOSTS = 10
+
+
+def report_timings(results: List[CheckResult]) -> List[str]:
+    """
+    Print a latency histogram of the checked URLs and the slowest hosts.
+
+    :returns: The same report as step summary lines
+    """
+    timed = [r for r in results if r.timings]
+    if not timed:
+        return []
+    counts = [0] * (len(LATENCY_BUCKETS) + 1)
+    hosts: Dict[str, List[Dict[str, float]]] = {}
+    for result in timed:
+        counts[bisect_right(LATENCY_BUCKETS, result.timings['total'])] += 1
+        hosts.setdefault(url_host(result.url), []).append(result.timings)
+    labels = [f"< {bound}s" for bound in LATENCY_BUCKETS] + [f">= {LATENCY_BUCKETS[-1]}s"]
+
+    print_title("⏱️ REQUEST TIMINGS")
+    summary = [f"## ⏱️ Request Timings ({len(timed)} URLs)\n\n",
+               "| Latency | URLs |\n|---|---|\n"]
+    width = max(counts)
+    for label, count in zip(labels, counts):
+        bar = '█' * round(40 * count / width) if width else ''
+        print(f"{label:>8} {count:5} {bar}")
+        summary.append(f"| {label} | {count} |\n")
+
+    slowest = sorted(hosts.items(), key=lambda item: -sum(t['total'] for t in item[1]))[:SLOWEST_HOSTS]
+    print("\nSlowest hosts (total time, mean per URL: connect / tls / ttfb / queued):")
+    summary.append("\n| Host | URLs | Total | Connect | TLS | TTFB | Queued | Redirect hops | Retries |\n"
+                   "|---|---|---|---|---|---|---|---|---|\n")
+    for host, timings in slowest:
+        total = sum(t['total'] for t in timings)
+        mean = {phase: sum(t[phase] for t in timings) / len(timings)
+                for phase in ('connect', 'tls', 'ttfb', 'queue_wait')}
+        hops = sum(t['redirects'] for t in timings)
+        retries = sum(t.get('retries', 0) for t in timings)
+        print(f"  {host}: {total:.2f}s for {len(timings)} URL(s), "
+              f"{mean['connect']:.2f}s / {mean['tls']:.2f}s / {mean['ttfb']:.2f}s / "
+              f"{mean['queue_wait']:.2f}s, {hops} redirect hop(s), {retries} retries")
+        summary.append(f"| {host} | {len(timings)} | {total:.2f}s | {mean['connect']:.2f}s | "
+                       f"{mean['tls']:.2f}s | {mean['ttfb']:.2f}s | {mean['queue_wait']:.2f}s | "
+                       f"{hops} | {retries} |\n")
+    summary.append("\n")
+    return summary
+
+
+def save_timings(path: Path, results: List[CheckResult]) -> None:
+    """Write the request timings of every checked URL to a JSON file."""
+    timings = {r.url: r.timings for r in sorted(results, key=lambda r: r.index) if r.timings}
+    path.write_text(json.dumps(timings, indent=2), encoding='utf-8')
+
+
+def report_results(results: List[CheckResult], url_index: UrlIndex, args,
+                   policy: ResultPolicy) -> bool:
+    """
+    Print the results, classify them with `policy` (the ignore/allow lists
+    and status policies), and write the GitHub step summary.
+
+    :returns: Whether the run should fail
+    """
+    gh_summary_file = os.getenv('GITHUB_STEP_SUMMARY')
+    results = sorted(results, key=lambda x: x.index)
 
     redirects = []
     errors = []
     ignored_redirects = []
     ignored_errors = []
+    not_checked = []
     error_count = 0
-    for index, url, final_url, error in results:
-        print(f"{index}. {url}")
+    cached_count = 0
+    for result in results:
+        index, url, final_url = result.index, result.url, result.final_url
+        if result.not_checked:
+            print(f"{index}. {url} (not checked)")
+            not_checked.append(url)
+            continue
+        if result.cached:
+            cached_count += 1
+            print(f"{index}. {url} (cached)")
+        else:
+            print(f"{index}. {url}")
+        if result.same_as:
+            print(f"\t🔗 Same resource as {result.same_as}")
+        verdict = policy.classify(result)
+        error = verdict.error
         if error:
-            if should_ignore_error(url):
+            if verdict.error_ignored:
                 print(f"\t⚠️  Error (ignored): {error}")
                 ignored_errors.append((url, error))
             else:
                 error_count += 1
                 print(f"\t❌ Error: {error}")
-                errors.append((url, error))
+                errors.append((url, error, result.unreachable_origin))
         if final_url:
-            if should_ignore_redirect(url):
+            if verdict.redirect_ignored:
                 print(f"\t↪️⚠️ (ignored) Redirects to: {final_url}")
                 ignored_redirects.append((url, final_url))
             else:
                 redirects.append((url, final_url))
                 print(f"\t↪️  Redirects to: {final_url}")
 
+    if cached_count:
+        print(f"\n♻️  {cached_count} of {len(results)} result(s) reused from the cache")
+
     if ignored_redirects or ignored_errors:
         print_title(f"🫣 IGNORED EXCEPTIONS")
         if ignored_redirects:
@@ -227,51 +1867,196 @@ def main():
                 print(f"  {url}\n    → {final_url}\n")
             print()
         if ignored_errors:
-            print(f"⚠️ Ignored {len(ignored_errors)} error(s) (in exception list):\n")
+            print(f"⚠️ Ignored {len(ignored_errors)} error(s) (in exception/allow list or allowed status):\n")
             for url, error in ignored_errors:
                 print(f"  {url}: {error}\n")
             print()
 
+    # The step summary is built in memory and written once at the end
+    summary = []
+    # Links are labelled with their file when URLs come from several files
+    show_files = len({o.file for occurrences in url_index.values() for o in occurrences}) > 1
+
     print_title(f"↪️ SUMMARY OF REDIRECTS")
     if redirects:
         print(f"Found {len(redirects)} redirect(s)\n")
-        if gh_summary_file:
-            with open(gh_summary_file, 'a', encoding='utf-8') as f:
-                f.write(f"## 🔗 URL Redirects Found ({len(redirects)})\n\n")
-                for original, redirected in redirects:
-                    f.write(f"- Original:\t{original}\n")
-                    f.write(f"  Redirect:\t{redirected}\n")
-                    line_num = find_line_number(text, original)
-                    line_link = create_github_line_link(line_num, markdown_file)
-                    f.write(f"  Line: {line_link}\n")
-                f.write("\n")
-
+        summary.append(f"## 🔗 URL Redirects Found ({len(redirects)})\n\n")
         for original, redirected in redirects:
-            line_num = find_line_number(text, original)
+            occurrences = url_index[original]
+            summary.append(f"- Original:\t{original}\n")
+            summary.append(f"  Redirect:\t{redirected}\n")
+            summary.append(f"  Line: {format_occurrences(occurrences, link=True, show_file=show_files)}\n")
             print(f"Original:  {original}")
-            print(f"Redirect:  {redirected}\n")
+            print(f"Redirect:  {redirected}")
+            print(f"Found at:  {format_occurrences(occurrences)}\n")
+        summary.append("\n")
     else:
         print("✅ No redirects found!")
 
     print_title(f"‼️ ERRORS ENCOUNTERED")
     if error_count > 0:
         print(f"{error_count} URL(s) had errors during checking")
-        if gh_summary_file:
-            with open(gh_summary_file, 'a', encoding='utf-8') as f:
-                f.write(f"## ❌ Errors Encountered ({error_count})\n\n")
-                for url, error in errors:
-                    line_num = find_line_number(text, url)
-                    # Escape pipe characters in error message
-                    line_link = create_github_line_link(line_num, markdown_file)
-                    f.write(f"- Error for {url}: {error}\n  Line: {line_link}\n")
-                f.write("\n")
-        for url, error in errors:
-            print(f"{url}\n  Error: {error}\n\n")
+        summary.append(f"## ❌ Errors Encountered ({error_count})\n\n")
+        # URLs on an origin that could not be connected to are reported together
+        unreachable: Dict[str, List[Tuple[str, str]]] = {}
+        for url, error, origin in errors:
+            if origin:
+                unreachable.setdefault(origin, []).append((url, error))
+        unreachable = {origin: failed for origin, failed in unreachable.items() if len(failed) > 1}
+        for url, error, origin in errors:
+            if origin in unreachable:
+                continue
+            occurrences = url_index[url]
+            summary.append(f"- Error for {url}: {error}\n")
+            summary.append(f"  Line: {format_occurrences(occurrences, link=True, show_file=show_files)}\n")
+            print(f"{url}\n  Error: {error}\n  Found at: {format_occurrences(occurrences)}\n\n")
+        for origin, failed in unreachable.items():
+            error = failed[0][1]
+            summary.append(f"- {origin} is unreachable, {len(failed)} URLs failed: {error}\n")
+            print(f"🔌 {origin} is unreachable, {len(failed)} URLs failed\n  Error: {error}")
+            for url, _ in failed:
+                occurrences = url_index[url]
+                summary.append(f"  - {url} (Line: {format_occurrences(occurrences, link=True, show_file=show_files)})\n")
+                print(f"  {url}\n    Found at: {format_occurrences(occurrences)}")
+            print("\n")
+        summary.append("\n")
     else:
         print("✅ No errors encountered!")
 
-    if error_count > 0 or (redirects and fail_on_redirect):
+    if not_checked:
+        print_title("⏳ NOT CHECKED")
+        budget = f" of {args.time_budget:g}s" if args.time_budget else ""
+        print(f"{len(not_checked)} URL(s) not checked before the time budget{budget} ran out\n")
+        summary.append(f"## ⏳ Not Checked ({len(not_checked)})\n\n")
+        for url in not_checked:
+            print(f"  {url}")
+            summary.append(f"- {url}\n")
+        summary.append("\n")
+
+    summary.extend(report_timings(results))
+    if args.timings:
+        save_timings(args.timings, results)
+
+    if gh_summary_file and summary:
+        with open(gh_summary_file, 'a', encoding='utf-8') as f:
+            f.write(''.join(summary))
+
+    return error_count > 0 or bool(redirects and args.fail_on_redirect)
+
+
+def main():
+    args = parse_cli_args()
+    policy = ResultPolicy.from_args(args)
+
+    if args.merge:
+        print_title(f"🧩 Merging {len(args.merge)} results file(s)...")
+        try:
+            results, url_index = load_results(args.merge)
+        except (OSError, ValueError, TypeError) as e:
+            print(f"❌ Error reading results: {e}")
+            sys.exit(1)
+        print(f"Loaded results for {len(results)} unique URLs")
+        sys.exit(1 if report_results(results, url_index, args, policy) else 0)
+
+    markdown_files = expand_markdown_paths(args.markdown_files)
+    if not markdown_files:
+        print("❌ No Markdown files to scan")
         sys.exit(1)
+    files_label = markdown_files[0] if len(markdown_files) == 1 else f"{len(markdown_files)} files"
+    if args.diff:
+        print_title(f"🔍 Extracting URLs added to {files_label} in {args.diff}...")
+    else:
+        print_title(f"🔍 Extracting URLs from {files_label}...")
+    # URLs are deduplicated across files, each keeping all its occurrences
+    url_index: UrlIndex = {}
+    for markdown_file in markdown_files:
+        if args.diff:
+            try:
+                file_index = extract_urls_from_diff(git_diff(args.diff, markdown_file), markdown_file)
+            except subprocess.CalledProcessError as e:
+                print(f"❌ Error running git diff: {e.stderr.strip()}")
+                sys.exit(1)
+        else:
+            try:
+                text = Path(markdown_file).read_text(encoding='utf-8')
+                file_index = extract_urls_from_markdown(text, markdown_file)
+            except Exception as e:
+                print(f"❌ Error reading file {markdown_file}: {e}")
+                sys.exit(1)
+        if len(markdown_files) > 1:
+            print(f"{markdown_file}: {len(file_index)} unique URLs")
+        for url, occurrences in file_index.items():
+            url_index.setdefault(url, []).extend(occurrences)
+    urls = list(url_index)
+    print(f"Found {len(urls)} unique URLs")
+    if not urls:
+        print("No URLs found in the file(s).")
+        sys.exit(0)
+    groups = group_equivalent_urls(urls)
+    to_check = list(groups)
+    if len(to_check) < len(urls):
+        print(f"{len(urls) - len(to_check)} URL(s) are other spellings of the same resource, "
+              f"checking {len(to_check)} resources")
+
+    print_title("🔗 Checking for redirects...")
+    if args.shard:
+        shard_urls = sum(1 for url in to_check if shard_of(url_host(url), args.shard[1]) == args.shard[0])
+        print(f"Shard {args.shard[0]}/{args.shard[1]}: checking {shard_urls} of {len(to_check)} URLs")
+    cache = LinkCache(args.cache, args.cache_ttl) if args.cache else None
+    no_head_hosts = NoHeadHosts(args.no_head_hosts)
+    checkpoint = Checkpoint(args.checkpoint, args.resume) if args.checkpoint else None
+    if checkpoint and checkpoint.settled:
+        print(f"Resuming: {len(checkpoint.settled)} result(s) already in {args.checkpoint}")
+    progress = Progress(shard_urls if args.shard else len(to_check), policy)
+    # Other spellings of a resource are only checked while the ones checked
+    # so far fail, as e.g. the http and https or www. and bare hosts can be
+    # served differently
+    resource = {url: first for first, spellings in groups.items() for url in spellings}
+    untried = {first: spellings[1:] for first, spellings in groups.items()}
+    checked: Dict[str, CheckResult] = {}
+    deadline = time.monotonic() + args.time_budget if args.time_budget else None
+    round_urls, round_shard = to_check, args.shard
+    try:
+        while round_urls:
+            round_results = asyncio.run(check_all_redirects(
+                round_urls,
+                max_connections=args.max_connections,
+                max_per_host=args.max_per_host,
+                cache=cache,
+                hedge=args.hedge,
+                no_head_hosts=no_head_hosts,
+                host_checkers=[GitHubRepoChecker(args.github_token)],
+                timeout=args.timeout,
+                shard=round_shard,
+                checkpoint=checkpoint,
+                on_result=progress,
+                time_budget=None if deadline is None else max(0.0, deadline - time.monotonic()),
+                retry=RetryPolicy(args.retries, args.retry_budget),
+            ))
+            round_urls = []
+            for result in round_results:
+                checked[result.url] = result
+                first = resource[result.url]
+                if check_failed(result) and untried[first]:
+                    round_urls.append(untried[first].pop(0))
+            if round_urls:
+                print(f"\n🔀 {len(round_urls)} resource(s) failed, checking their other spellings")
+                progress.total += len(round_urls)
+            # The other spellings belong to resources of this shard
+            round_shard = None
+    finally:
+        if checkpoint:
+            checkpoint.close()
+    if no_head_hosts.learnt:
+        print(f"\n🙅 Hosts rejecting HEAD requests: {', '.join(sorted(no_head_hosts.learnt))}")
+    indices = {url: i for i, url in enumerate(urls, 1)}
+    results = [spelling for first, spellings in groups.items() if first in checked
+               for spelling in fan_out_result(checked, spellings, indices)]
+    if args.results:
+        save_results(args.results, results, url_index)
+
+    print_title("📋 Results")
+    sys.exit(1 if report_results(results, url_index, args, policy) else 0)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,609 @@
+"""Tests for check_redirects."""
+import asyncio
+import io
+import json
+import os
+import time
+import unittest
+import unittest.mock
+from pathlib import Path
+
+import httpx
+
+try:
+    import check_redirects
+except ImportError:
+    os.chdir(os.path.dirname(os.path.realpath(__file__)))
+    import check_redirects
+
+
+class TestExtractUrlsFromMarkdown(unittest.TestCase):
+    """Test finding the URLs of every kind of Markdown link."""
+
+    @staticmethod
+    def extract(text):
+        return list(check_redirects.extract_urls_from_markdown(text))
+
+    def test_nested_badge_links(self):
+        """Badge images inside links give the image and the link target (README.md)."""
+        text = (
+            '[![awesome micro:bit logo](https://user-images.githubusercontent.com/4189262/'
+            '60908738-830bb780-a274-11e9-9d86-6b82ab89334f.png)](https://github.com/carlosperate/awesome-microbit)\n'
+            '- [![watch badge](https://img.shields.io/github/watchers/carlosperate/awesome-microbit.svg'
+            '?label=Watch&style=social)](https://github.com/carlosperate/awesome-microbit/watchers) "Watch" it.\n'
+            '- [![Bluesky Follow](https://img.shields.io/badge/(Bluesky)-@awesomemicrobit-8A2BE2'
+            '?style=social&logo=bluesky)](https://bsky.app/profile/awesomemicrobit.bsky.social) Or follow '
+            '[@awesomemicrobit.bsky.social](https://bsky.app/profile/awesomemicrobit.bsky.social) on Bluesky.\n'
+        )
+        self.assertEqual(self.extract(text), [
+            'https://user-images.githubusercontent.com/4189262/60908738-830bb780-a274-11e9-9d86-6b82ab89334f.png',
+            'https://github.com/carlosperate/awesome-microbit',
+            'https://img.shields.io/github/watchers/carlosperate/awesome-microbit.svg?label=Watch&style=social',
+            'https://github.com/carlosperate/awesome-microbit/watchers',
+            'https://img.shields.io/badge/(Bluesky)-@awesomemicrobit-8A2BE2?style=social&logo=bluesky',
+            'https://bsky.app/profile/awesomemicrobit.bsky.social',
+        ])
+
+    def test_links_inside_brackets(self):
+        """Links wrapped in brackets do not take the closing ones (README.md)."""
+        text = ('[[Bulldozer](https://www.thingiverse.com/thing:3330288)], '
+                '[[WALL-E](https://www.thingiverse.com/thing:3456871)] - Models.')
+        self.assertEqual(self.extract(text), ['https://www.thingiverse.com/thing:3330288',
+                                              'https://www.thingiverse.com/thing:3456871'])
+
+    def test_link_destinations(self):
+        """Inline links keep balanced parentheses, autolinks and references are found."""
+        text = ('[Foo](https://en.wikipedia.org/wiki/Foo_(bar)) and ![img](https://example.com/a.png)\n'
+                '<https://example.com/autolink> and [angle](<https://example.com/angle>)\n'
+                '[ref]: https://example.com/reference\n'
+                '[https://example.com/text](https://example.com/target)\n'
+                '[http://contributor-covenant.org/version/1/4][version]\n')
+        self.assertEqual(self.extract(text), [
+            'https://en.wikipedia.org/wiki/Foo_(bar)',
+            'https://example.com/a.png',
+            'https://example.com/autolink',
+            'https://example.com/angle',
+            'https://example.com/reference',
+            'https://example.com/text',
+            'https://example.com/target',
+            'http://contributor-covenant.org/version/1/4',
+        ])
+
+    def test_bare_url_trimming(self):
+        """Bare URLs lose trailing punctuation and unbalanced closing brackets."""
+        cases = {
+            'See https://example.com/page.': 'https://example.com/page',
+            'One https://example.com/a, two': 'https://example.com/a',
+            'Really https://example.com/b?!': 'https://example.com/b',
+            '(see https://example.com/c)': 'https://example.com/c',
+            '(see https://en.wikipedia.org/wiki/Foo_(bar))': 'https://en.wikipedia.org/wiki/Foo_(bar)',
+            '**https://example.com/bold**': 'https://example.com/bold',
+            '"https://example.com/quoted"': 'https://example.com/quoted',
+            'https://example.com/?q=1&r=2': 'https://example.com/?q=1&r=2',
+        }
+        for text, url in cases.items():
+            with self.subTest(text=text):
+                self.assertEqual(self.extract(text), [url])
+
+    def test_occurrences(self):
+        """Every occurrence of a URL is recorded with its file, line and column."""
+        text = ('# Title\n'
+                '- [a](https://example.com/a) and https://example.com/b\n'
+                '\n'
+                'Again [a](https://example.com/a)\n')
+        urls = check_redirects.extract_urls_from_markdown(text, 'README.md')
+
+        occurrence = check_redirects.UrlOccurrence
+        self.assertEqual(urls, {
+            'https://example.com/a': [occurrence('README.md', 2, 7), occurrence('README.md', 4, 11)],
+            'https://example.com/b': [occurrence('README.md', 2, 34)],
+        })
+
+    def test_urls_from_diff(self):
+        """Only added lines are scanned, numbered from the hunk headers in the new file."""
+        diff = ('diff --git a/README.md b/README.md\n'
+                'index 1111111..2222222 100644\n'
+                '--- a/README.md\n'
+                '+++ b/README.md\n'
+                '@@ -3 +3 @@ ## Tools\n'
+                '-- [Old](https://example.com/old)\n'
+                '+- [New](https://example.com/new)\n'
+                '@@ -10,0 +11,2 @@ ## Tools\n'
+                '+Plain line\n'
+                '+See https://example.com/a and [b](https://example.com/b)\n'
+                '@@ -20,2 +22,2 @@\n'
+                ' Context https://example.com/context\n'
+                '-- [gone](https://example.com/gone)\n'
+                '+- [c](https://example.com/new)\n'
+                '@@ -40 +41 @@\n'
+                '-Last https://example.com/last\n'
+                '\\ No newline at end of file\n'
+                '+Last https://example.com/last-new\n'
+                '\\ No newline at end of file\n')
+        urls = check_redirects.extract_urls_from_diff(diff, 'README.md')
+
+        occurrence = check_redirects.UrlOccurrence
+        self.assertEqual(urls, {
+            'https://example.com/new': [occurrence('README.md', 3, 9), occurrence('README.md', 23, 7)],
+            'https://example.com/a': [occurrence('README.md', 12, 5)],
+            'https://example.com/b': [occurrence('README.md', 12, 35)],
+            'https://example.com/last-new': [occurrence('README.md', 41, 6)],
+        })
+
+    def test_linear_time_on_pathological_input(self):
+        """Long runs of brackets, parentheses, schemes and URLs are scanned quickly."""
+        size = 500_000
+        texts = {
+            'brackets': '[' * size + '](https://example.com/' + ']' * size,
+            'parentheses': '](https://example.com/' + '(' * size,
+            'schemes': 'https://' * (size // 8),
+            'urls on a line': ' '.join(['[x](https://example.com/a_(b))'] * (size // 30)),
+        }
+        for name, text in texts.items():
+            with self.subTest(text=name):
+                started = time.perf_counter()
+                check_redirects.extract_urls_from_markdown(text)
+                self.assertLess(time.perf_counter() - started, 2)
+
+    def test_large_corpus(self):
+        """Megabytes of real Markdown (the README 60 times, ~7 MB) are scanned quickly."""
+        readme = Path(__file__).resolve().parents[3] / 'README.md'
+        text = readme.read_text(encoding='utf-8') * 60
+        started = time.perf_counter()
+        urls = check_redirects.extract_urls_from_markdown(text, 'README.md')
+        self.assertLess(time.perf_counter() - started, 3)
+        self.assertIn('https://github.com/carlosperate/awesome-microbit', urls)
+
+
+class TestIgnoreMatcher(unittest.TestCase):
+    """Test matching URLs against ignore rules."""
+
+    def setUp(self):
+        self.matcher = check_redirects.IgnoreMatcher({
+            'youtube.com',
+            'https://vittascience.com/microbit/',
+            'https://python.microbit.org',
+            'https://example.com/page?id=1',
+        })
+
+    def test_bare_domain_matches_host_and_subdomains(self):
+        """A bare domain matches that host and all its subdomains."""
+        for url in ('https://youtube.com/watch?v=1', 'https://www.youtube.com/',
+                    'http://m.YouTube.com/shorts/abc'):
+            with self.subTest(url=url):
+                self.assertTrue(self.matcher.matches(url))
+
+    def test_bare_domain_is_not_a_substring_match(self):
+        """A bare domain only matches whole host name labels."""
+        for url in ('https://notyoutube.com/', 'https://youtube.com.evil.org/'):
+            with self.subTest(url=url):
+                self.assertFalse(self.matcher.matches(url))
+
+    def test_url_rule_matches_path_prefix_on_same_host(self):
+        """A URL without a query matches paths below it on the exact same host."""
+        for url in ('https://vittascience.com/microbit/', 'http://vittascience.com/microbit/ide?x=1#top',
+                    'https://python.microbit.org', 'https://python.microbit.org/v/3'):
+            with self.subTest(url=url):
+                self.assertTrue(self.matcher.matches(url))
+        for url in ('https://vittascience.com/arduino/', 'https://vittascience.com/',
+                    'https://www.vittascience.com/microbit/', 'https://microbit.org/'):
+            with self.subTest(url=url):
+                self.assertFalse(self.matcher.matches(url))
+
+    def test_url_rule_with_query_matches_exact_url(self):
+        """A URL with a query only matches that exact URL, whatever the scheme and fragment."""
+        self.assertTrue(self.matcher.matches('https://example.com/page?id=1'))
+        self.assertTrue(self.matcher.matches('http://example.com/page?id=1#section'))
+        for url in ('https://example.com/page?id=2', 'https://example.com/page',
+                    'https://example.com/page/sub?id=1', 'https://example.com/page?id=1&x=2'):
+            with self.subTest(url=url):
+                self.assertFalse(self.matcher.matches(url))
+
+    def test_ignores_blank_rules_and_invalid_urls(self):
+        """Blank rules are skipped and URLs without a valid host never match."""
+        matcher = check_redirects.IgnoreMatcher({'', '  ', 'example.com'})
+        self.assertEqual(len(matcher), 1)
+        self.assertFalse(matcher.matches('not a url'))
+        self.assertFalse(matcher.matches('http://[invalid/'))
+
+
+class TestHostScheduler(unittest.IsolatedAsyncioTestCase):
+    """Test running jobs with global and per-host concurrency caps."""
+
+    def setUp(self):
+        self.in_flight = {}
+        self.max_in_flight = {}
+        self.total = 0
+        self.max_total = 0
+        self.started = []
+
+    async def fake_job(self, job):
+        """Count the jobs in flight per host and in total while pretending to work."""
+        host, name = job
+        self.started.append(name)
+        self.in_flight[host] = self.in_flight.get(host, 0) + 1
+        self.max_in_flight[host] = max(self.max_in_flight.get(host, 0), self.in_flight[host])
+        self.total += 1
+        self.max_total = max(self.max_total, self.total)
+        await asyncio.sleep(0.01)
+        self.in_flight[host] -= 1
+        self.total -= 1
+        return name
+
+    async def run_all(self, scheduler, run_job=None):
+        async with asyncio.timeout(5):
+            return [result async for result in scheduler.run(run_job or self.fake_job)]
+
+    async def test_global_and_per_host_caps(self):
+        """No more jobs run at once than the global cap, or the per-host cap on a host."""
+        scheduler = check_redirects.HostScheduler(max_in_flight=5, max_per_host=2)
+        for host, count in (('a.com', 10), ('b.com', 10), ('c.com', 2)):
+            for i in range(count):
+                scheduler.add(host, (host, f'{host}/{i}'))
+
+        results = await self.run_all(scheduler)
+
+        self.assertEqual(len(results), 22)
+        self.assertEqual(self.max_total, 5)
+        self.assertEqual(self.max_in_flight, {'a.com': 2, 'b.com': 2, 'c.com': 2})
+
+    async def test_hosts_served_round_robin(self):
+        """Hosts take turns instead of one host's jobs running in a burst."""
+        scheduler = check_redirects.HostScheduler(max_in_flight=1, max_per_host=1)
+        for host, count in (('a.com', 3), ('b.com', 2), ('c.com', 1)):
+            for i in range(count):
+                scheduler.add(host, (host, f'{host[0]}{i}'))
+
+        await self.run_all(scheduler)
+
+        self.assertEqual(self.started, ['a0', 'b0', 'c0', 'a1', 'b1', 'a2'])
+
+    async def test_deferred_job_holds_back_only_its_host(self):
+        """A deferred job runs again after its delay, other hosts go on meanwhile."""
+        scheduler = check_redirects.HostScheduler(max_in_flight=1, max_per_host=1)
+        scheduler.add('a.com', ('a.com', 'a0'))
+        scheduler.add('a.com', ('a.com', 'a1'))
+        scheduler.add('b.com', ('b.com', 'b0'))
+        scheduler.add('b.com', ('b.com', 'b1'))
+        deferred = []
+
+        async def run_job(job):
+            if job[1] == 'a0' and not deferred:
+                deferred.append(time.monotonic())
+                scheduler.defer('a.com', job, 0.2)
+                return None
+            if job[1] == 'a0':
+                deferred.append(time.monotonic())
+            return await self.fake_job(job)
+
+        results = await self.run_all(scheduler, run_job)
+
+        # The deferred job goes first again on its host, nothing is yielded for the deferral
+        self.assertEqual(self.started, ['b0', 'b1', 'a0', 'a1'])
+        self.assertEqual(results, self.started)
+        self.assertGreaterEqual(deferred[1] - deferred[0], 0.2)
+
+    async def test_workers_exit_after_deferred_last_job(self):
+        """The run finishes when the only job left was deferred and then done."""
+        scheduler = check_redirects.HostScheduler(max_in_flight=4, max_per_host=2)
+        scheduler.add('a.com', ('a.com', 'a0'))
+        attempts = []
+
+        async def run_job(job):
+            attempts.append(job)
+            if len(attempts) == 1:
+                scheduler.defer('a.com', job, 0.05)
+                return None
+            return job[1]
+
+        self.assertEqual(await self.run_all(scheduler, run_job), ['a0'])
+        self.assertEqual(len(attempts), 2)
+
+    async def test_drain(self):
+        """Draining removes a host's pending jobs, or only those matching."""
+        scheduler = check_redirects.HostScheduler(max_in_flight=1, max_per_host=1)
+        for name in ('http-1', 'https-1', 'http-2', 'https-2'):
+            scheduler.add('a.com', ('a.com', name))
+        scheduler.add('b.com', ('b.com', 'b0'))
+        drained = []
+
+        async def run_job(job):
+            if job[1] == 'http-1':
+                drained.extend(scheduler.drain('a.com', lambda other: other[1].startswith('http-')))
+            return await self.fake_job(job)
+
+        await self.run_all(scheduler, run_job)
+
+        self.assertEqual(drained, [('a.com', 'http-2')])
+        self.assertEqual(self.started, ['http-1', 'b0', 'https-1', 'https-2'])
+        self.assertEqual(scheduler.drain('a.com'), [])
+
+    async def test_extra_slots_respect_caps(self):
+        """Extra slots (for hedged requests) are only given within the caps."""
+        scheduler = check_redirects.HostScheduler(max_in_flight=3, max_per_host=2)
+        scheduler._cond = asyncio.Condition()
+
+        self.assertTrue(scheduler.take_extra_slot('a.com'))
+        self.assertTrue(scheduler.take_extra_slot('a.com'))
+        self.assertFalse(scheduler.take_extra_slot('a.com'))
+        self.assertTrue(scheduler.take_extra_slot('b.com'))
+        self.assertFalse(scheduler.take_extra_slot('c.com'))
+        await scheduler.release_extra_slot('a.com')
+        self.assertTrue(scheduler.take_extra_slot('c.com'))
+
+    def test_invalid_limits(self):
+        """Caps below 1 are rejected."""
+        with self.assertRaises(ValueError):
+            check_redirects.HostScheduler(max_in_flight=0)
+        with self.assertRaises(ValueError):
+            check_redirects.HostScheduler(max_per_host=0)
+
+
+class TestEquivalentUrls(unittest.TestCase):
+    """Test checking each resource once across its URL spellings."""
+
+    def test_group_equivalent_urls(self):
+        """Spellings are grouped by resource, https first then in order found."""
+        urls = ['http://example.com/a', 'https://www.Example.com/a/#top', 'https://example.com/a',
+                'https://example.com/b', 'https://example.com/a?q=1', 'http://example.com:8080/a']
+
+        self.assertEqual(check_redirects.group_equivalent_urls(urls), {
+            'https://www.Example.com/a/#top': ['https://www.Example.com/a/#top', 'https://example.com/a',
+                                               'http://example.com/a'],
+            'https://example.com/b': ['https://example.com/b'],
+            'https://example.com/a?q=1': ['https://example.com/a?q=1'],
+            'http://example.com:8080/a': ['http://example.com:8080/a'],
+        })
+
+    def test_unchecked_spellings_get_the_verdict_without_redirect(self):
+        """Spellings not requested share the verdict but are never redirects."""
+        spellings = ['https://example.com/ok', 'https://example.com/ok/', 'http://example.com/ok']
+        indices = {url: i for i, url in enumerate(spellings, 1)}
+        checked = {spellings[0]: check_redirects.CheckResult(
+            7, spellings[0], status=200, final_url='https://example.com/new', timings={'total': 1.0})}
+
+        fanned = check_redirects.fan_out_result(checked, spellings, indices)
+
+        self.assertEqual([r.index for r in fanned], [1, 2, 3])
+        self.assertEqual(fanned[0].final_url, 'https://example.com/new')
+        self.assertIsNone(fanned[0].same_as)
+        for result in fanned[1:]:
+            self.assertEqual(result.status, 200)
+            self.assertIsNone(result.final_url)
+            self.assertIsNone(result.timings)
+            self.assertEqual(result.same_as, spellings[0])
+
+    def test_checked_spellings_keep_their_own_result(self):
+        """After a failed spelling, the one that worked gives its verdict to the rest."""
+        spellings = ['https://www.example.com/a', 'http://www.example.com/a', 'http://example.com/a']
+        indices = {url: i for i, url in enumerate(spellings, 1)}
+        checked = {
+            spellings[0]: check_redirects.CheckResult(1, spellings[0], error='ConnectError'),
+            spellings[1]: check_redirects.CheckResult(1, spellings[1], status=200),
+        }
+
+        fanned = check_redirects.fan_out_result(checked, spellings, indices)
+
+        self.assertEqual(fanned[0].error, 'ConnectError')
+        self.assertEqual((fanned[1].status, fanned[1].same_as), (200, None))
+        self.assertEqual((fanned[2].status, fanned[2].error, fanned[2].same_as),
+                         (200, None, spellings[1]))
+
+
+class TestCheckRedirect(unittest.IsolatedAsyncioTestCase):
+    """Test checking a single URL with HEAD and the GET fallback."""
+
+    async def check(self, handler, url='https://example.com/page'):
+        requests = []
+
+        def recording_handler(request):
+            requests.append(request.method)
+            return handler(request)
+
+        async with httpx.AsyncClient(transport=httpx.MockTransport(recording_handler)) as client:
+            result = await check_redirects.check_redirect(client, url, 1)
+        return result, requests
+
+    async def test_head_rejected_falls_back_to_get(self):
+        """A HEAD answered with 405 is checked again with GET."""
+        result, requests = await self.check(
+            lambda request: httpx.Response(405 if request.method == 'HEAD' else 200))
+
+        self.assertEqual(requests, ['HEAD', 'GET'])
+        self.assertEqual(result.status, 200)
+
+    async def test_hedge_needs_a_free_host_slot(self):
+        """A slow HEAD is only hedged with a GET if the host has a free slot."""
+        async def slow_head(request):
+            if request.method == 'HEAD':
+                await asyncio.sleep(0.2)
+            return httpx.Response(200)
+
+        for free_slot in (True, False):
+            with self.subTest(free_slot=free_slot):
+                scheduler = check_redirects.HostScheduler(max_in_flight=4, max_per_host=2)
+                scheduler._cond = asyncio.Condition()
+                # Jobs in flight on the host, including the one being checked
+                scheduler._in_flight = {'example.com': 1 if free_slot else 2}
+                scheduler._total_in_flight = scheduler._in_flight['example.com']
+                requests = []
+
+                async def handler(request):
+                    requests.append(request.method)
+                    return await slow_head(request)
+
+                async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+                    result = await check_redirects.check_redirect(
+                        client, 'https://example.com/page', 1,
+                        hedge=check_redirects.HedgeDelay(initial=0.05), scheduler=scheduler)
+
+                self.assertEqual(result.status, 200)
+                self.assertEqual(requests, ['HEAD', 'GET'] if free_slot else ['HEAD'])
+                # The extra slot is given back
+                self.assertEqual(scheduler._in_flight['example.com'], 1 if free_slot else 2)
+
+    async def test_throttled_head_is_the_verdict(self):
+        """A HEAD answered with a retry status is not followed by a GET."""
+        for status in sorted(check_redirects.RETRY_STATUSES):
+            with self.subTest(status=status):
+                result, requests = await self.check(
+                    lambda request: httpx.Response(status, headers={'Retry-After': '5'}))
+
+                self.assertEqual(requests, ['HEAD'])
+                self.assertEqual(result.status, status)
+                self.assertEqual(result.retry_after, 5)
+
+
+class GitHubGraphQLStandIn:
+    """
+    Stand-in for the GitHub GraphQL API, answering the repository lookups
+    sent by GitHubRepoChecker through an httpx.MockTransport.
+    """
+
+    def __init__(self, repos, errors=None, token='test-token'):
+        # 'owner/name' as linked -> 'owner/name' as it is now on GitHub
+        self.repos = {repo.lower(): current for repo, current in repos.items()}
+        # 'owner/name' -> GraphQL error type other than NOT_FOUND
+        self.errors = {repo.lower(): error for repo, error in (errors or {}).items()}
+        self.token = token
+        self.requests = []
+
+    def __call__(self, request):
+        self.requests.append(request)
+        if request.headers.get('authorization') != f'bearer {self.token}':
+            return httpx.Response(401, json={'message': 'Bad credentials'})
+        variables = json.loads(request.content)['variables']
+        data, errors = {}, []
+        i = 0
+        while f'o{i}' in variables:
+            alias, repo = f'r{i}', f"{variables[f'o{i}']}/{variables[f'n{i}']}"
+            current = self.repos.get(repo.lower())
+            if repo.lower() in self.errors or current is None:
+                data[alias] = None
+                errors.append({'type': self.errors.get(repo.lower(), 'NOT_FOUND'), 'path': [alias],
+                               'message': f"Could not resolve to a Repository with the name '{repo}'."})
+            else:
+                data[alias] = {'nameWithOwner': current, 'url': f'https://github.com/{current}'}
+            i += 1
+        payload = {'data': data}
+        if errors:
+            payload['errors'] = errors
+        return httpx.Response(200, json=payload)
+
+
+class TestGitHubRepoChecker(unittest.IsolatedAsyncioTestCase):
+    """Test the batched GitHub repository checks against a stand-in API."""
+
+    def setUp(self):
+        self.api = GitHubGraphQLStandIn(
+            {
+                'microbit-foundation/python-editor-v3': 'microbit-foundation/python-editor-v3',
+                'old-owner/old-name': 'new-owner/new-name',
+                'private/repo': 'private/repo',
+            },
+            errors={'private/repo': 'FORBIDDEN'},
+        )
+        self.checker = check_redirects.GitHubRepoChecker('test-token', api_url='https://graphql.test/')
+
+    async def check(self, urls):
+        jobs = list(enumerate(urls, 1))
+        async with httpx.AsyncClient(transport=httpx.MockTransport(self.api)) as client:
+            results, leftover = await self.checker.check(client, jobs)
+        return {result.url: result for result in results}, leftover
+
+    async def test_existing_repo(self):
+        """A repository that exists under the linked name is fine."""
+        url = 'https://github.com/microbit-foundation/python-editor-v3'
+        results, leftover = await self.check([url])
+
+        self.assertEqual(leftover, [])
+        self.assertEqual(results[url].status, 200)
+        self.assertIsNone(results[url].final_url)
+        self.assertIsNone(results[url].error)
+
+    async def test_name_case_is_not_a_redirect(self):
+        """GitHub names are case insensitive, a different case is fine."""
+        url = 'https://github.com/Microbit-Foundation/Python-Editor-V3'
+        results, _ = await self.check([url])
+
+        self.assertIsNone(results[url].final_url)
+
+    async def test_renamed_repo_redirects(self):
+        """A renamed or transferred repository redirects, keeping the fragment."""
+        url = 'https://github.com/old-owner/old-name#readme'
+        results, _ = await self.check([url])
+
+        self.assertEqual(results[url].status, 200)
+        self.assertEqual(results[url].final_url, 'https://github.com/new-owner/new-name#readme')
+
+    async def test_http_link_redirects_to_https(self):
+        """Links not using https://github.com/ redirect to the canonical URL."""
+        url = 'http://www.github.com/microbit-foundation/python-editor-v3'
+        results, _ = await self.check([url])
+
+        self.assertEqual(results[url].final_url,
+                         'https://github.com/microbit-foundation/python-editor-v3')
+
+    async def test_missing_repo_is_an_error(self):
+        """A deleted (or never existing) repository is a 404 error."""
+        url = 'https://github.com/nobody/nothing'
+        results, leftover = await self.check([url])
+
+        self.assertEqual(leftover, [])
+        self.assertEqual(results[url].status, 404)
+        self.assertIn('nobody/nothing not found', results[url].error)
+
+    async def test_other_errors_fall_back_to_http(self):
+        """Repositories failing with anything but NOT_FOUND are checked over HTTP."""
+        ok_url = 'https://github.com/microbit-foundation/python-editor-v3'
+        url = 'https://github.com/private/repo'
+        results, leftover = await self.check([ok_url, url])
+
+        self.assertEqual(leftover, [(2, url)])
+        self.assertEqual(list(results), [ok_url])
+
+    @unittest.mock.patch('sys.stdout', new_callable=io.StringIO)
+    async def test_api_failure_falls_back_to_http(self, mock_stdout):
+        """If the API request fails the whole batch is checked over HTTP."""
+        self.checker.token = 'wrong-token'
+        urls = ['https://github.com/microbit-foundation/python-editor-v3',
+                'https://github.com/nobody/nothing']
+        results, leftover = await self.check(urls)
+
+        self.assertEqual(results, {})
+        self.assertEqual(leftover, list(enumerate(urls, 1)))
+        self.assertIn('falling back to HTTP', mock_stdout.getvalue())
+
+    async def test_repos_looked_up_in_batches(self):
+        """Repositories are looked up BATCH_SIZE at a time."""
+        count = check_redirects.GitHubRepoChecker.BATCH_SIZE + 1
+        urls = [f'https://github.com/nobody/repo-{i}' for i in range(count)]
+        results, _ = await self.check(urls)
+
+        self.assertEqual(len(self.api.requests), 2)
+        self.assertEqual(len(results), count)
+
+    def test_no_token_claims_nothing(self):
+        """Without a token the GraphQL API can't be used, links go over HTTP."""
+        checker = check_redirects.GitHubRepoChecker('')
+
+        self.assertFalse(checker.claims('https://github.com/microbit-foundation/python-editor-v3'))
+
+    def test_only_repo_links_claimed(self):
+        """Links to GitHub pages other than a repository root are not claimed."""
+        self.assertTrue(self.checker.claims('https://github.com/owner/repo.git'))
+        for url in ('https://github.com/topics/microbit',
+                    'https://github.com/owner/repo/issues/1',
+                    'https://github.com/owner',
+                    'https://gist.github.com/owner/repo'):
+            with self.subTest(url=url):
+                self.assertFalse(self.checker.claims(url))
+
+    def test_host_checker_is_abstract(self):
+        """Host checkers have to implement claims() and check()."""
+        with self.assertRaises(TypeError):
+            check_redirects.HostChecker()
+
+
+if __name__ == '__main__':
+    unittest.main()